@@ -1,35 +1,83 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, send_file
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from web3 import Web3
 import json
+import orjson
 import os
 from datetime import datetime
-from functools import wraps
+from dateutil.relativedelta import relativedelta
+from functools import lru_cache, wraps
+from typing import NamedTuple
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from eth_utils import event_abi_to_log_topic
 from federated_learning import FederatedLearningSystem
-from ai_model import FraudDetectionModel
+from ai_model import FraudDetectionModel, get_genai_client
 from ssi import SSISystem
+from claim_store import get_claim_store
 import secrets
-import base64
-from google import genai
+import random
+import traceback
+import io
+import hashlib
+import requests
+import threading
+import time
+import atexit
+import numpy as np
+import logging
+
+# Model diagnostics go through logging; set LOG_LEVEL=DEBUG for per-claim traces
+logging.basicConfig(
+    level=os.environ.get('LOG_LEVEL', 'WARNING').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+
+class OrjsonProvider(JSONProvider):
+    """jsonify through orjson - large claim/policy lists serialize several times faster"""
+    
+    def dumps(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+        except TypeError:
+            # e.g. uint256 totals beyond 64 bits
+            return json.dumps(obj, sort_keys=True, default=str)
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
+app.json = OrjsonProvider(app)
+# Set FLASK_SECRET_KEY so sessions stay valid across restarts and gunicorn workers
+app.secret_key = os.environ.get('FLASK_SECRET_KEY') or secrets.token_hex(32)
+# Uploads are held in memory, so whole requests are capped (proof files included)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 32)) * 1024 * 1024
 CORS(app, supports_credentials=True, origins=['http://localhost:3000'])
 
-# Initialize Gemini AI with NEW API KEY
-GEMINI_API_KEY = "Your_API_Key"
-genai_client = genai.Client(api_key=GEMINI_API_KEY)
+# Initialize Gemini AI - the key comes from the environment or backend/.env, never from source
+load_dotenv()
+GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+if not GEMINI_API_KEY:
+    raise RuntimeError("GEMINI_API_KEY is not set - export it or add it to backend/.env")
+
+# Shared, thread-safe client with a pooled keep-alive connection
+genai_client = get_genai_client(GEMINI_API_KEY)
 
 print("="*60)
 print("🤖 Gemini AI Configuration")
 print("="*60)
-print(f"✅ API Key: {GEMINI_API_KEY[:20]}...")
+print("✅ API Key: loaded from environment")
 print(f"✅ Model: gemini-2.5-flash (Latest)")
 print(f"✅ Multimodal Support: Enabled")
 print("="*60)
 
 # Initialize systems
-fl_system = FederatedLearningSystem()
+# FL_SEED makes the simulated training noise reproducible
+fl_seed = os.environ.get('FL_SEED')
+fl_system = FederatedLearningSystem(seed=int(fl_seed) if fl_seed else None)
 
 # Initialize FraudDetectionModel with genai_client
 fraud_model = FraudDetectionModel(genai_client)
@@ -44,9 +92,113 @@ CONTRACT_ADDRESS = None
 CONTRACT_ABI = None
 contract = None
 
-# In-memory temporary storage ONLY for Gemini analysis and file data
-gemini_analysis_cache = {}
-claim_files_cache = {}
+# Multicall3 batches many contract reads into a single eth_call when it is deployed on the node
+MULTICALL3_ADDRESS = os.environ.get('MULTICALL3_ADDRESS', '0xcA11bde05977b3631167028862bE2a173976CA11')
+MULTICALL3_ABI = [{
+    'name': 'tryAggregate',
+    'type': 'function',
+    'stateMutability': 'payable',
+    'inputs': [
+        {'name': 'requireSuccess', 'type': 'bool'},
+        {'name': 'calls', 'type': 'tuple[]', 'components': [
+            {'name': 'target', 'type': 'address'},
+            {'name': 'callData', 'type': 'bytes'}
+        ]}
+    ],
+    'outputs': [
+        {'name': 'returnData', 'type': 'tuple[]', 'components': [
+            {'name': 'success', 'type': 'bool'},
+            {'name': 'returnData', 'type': 'bytes'}
+        ]}
+    ]
+}]
+# Calls per Multicall3 aggregate / JSON-RPC batch, kept under provider request limits
+MULTICALL_CHUNK_SIZE = int(os.environ.get('RPC_BATCH_SIZE', 500))
+multicall = None
+
+class Policy(NamedTuple):
+    """Decoded InsuranceClaim.policies(id) row"""
+    id: int
+    policyNumber: str
+    did: str
+    patientName: str
+    policyType: str
+    coverageAmount: int
+    premium: int
+    durationMonths: int
+    createdBy: str
+    insuranceCompany: str
+    status: str
+    createdAt: int
+    exists: bool
+
+class Claim(NamedTuple):
+    """Decoded InsuranceClaim.claims(id) row"""
+    id: int
+    claimNumber: str
+    policyId: int
+    policyNumber: str
+    did: str
+    patientName: str
+    claimType: str
+    amount: int
+    description: str
+    hospitalName: str
+    diagnosis: str
+    submittedBy: str
+    submittedAt: int
+    status: str
+    fraudScore: int
+    isFraudulent: bool
+    aiDecision: str
+    mlFraudType: str
+    mlConfidence: int
+    processedAt: int
+    processedBy: str
+    exists: bool
+
+ROW_TYPES = {'policies': Policy, 'claims': Claim}
+
+# Decoded contract rows: (contract address, fn name, id) -> (block number, row)
+# A row is reused while no new block has been mined, or forever once it is final;
+# at most ROW_CACHE_SIZE rows are kept, least recently used evicted first
+ROW_CACHE_SIZE = int(os.environ.get('ROW_CACHE_SIZE', 100_000))
+row_cache = OrderedDict()
+row_cache_lock = threading.Lock()
+FINAL_ROW_STATUS = {'claims': ('status', {'APPROVED', 'REJECTED'})}
+# Final rows are saved on shutdown (as plain JSON) so a restart does not re-read settled history
+ROW_CACHE_FILE = os.environ.get('ROW_CACHE_FILE', 'row_cache.json')
+
+# Contract event index: (fn name, id) -> last block with an event for that row
+EVENT_ROW_TABLES = (('claim', 'claims'), ('polic', 'policies'))
+EVENT_ID_ARGS = ('claimId', 'policyId', 'id')
+event_index = {'topics': {}, 'touched': {}, 'synced_block': None}
+event_index_lock = threading.Lock()
+
+# Owner index over fields that never change once a row exists: (contract address, fn name) ->
+# {'scanned': highest id read, field: {owner: [ids]}}, so a role only decodes the rows it owns.
+# Each indexed field maps to whether its owner value is an address compared lowercased
+OWNER_INDEX_FIELDS = {
+    'claims': {'submittedBy': True, 'did': False, 'policyId': False, 'claimNumber': False},
+    'policies': {'createdBy': True, 'did': False}
+}
+owner_index = {}
+owner_index_lock = threading.Lock()
+
+# Without Multicall3, reads are sent as JSON-RPC batches over one keep-alive session
+rpc_session = requests.Session()
+# Last resort for nodes without batch support: independent eth_calls fanned out over threads
+rpc_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('RPC_WORKERS', 32)))
+
+# Temporary storage ONLY for Gemini analysis and file data, bounded by TTL and size
+claim_store = get_claim_store()
+
+# Claims prepared for federated learning, reused while no new block is mined
+fl_claims_cache = {'block': None, 'claims': None}
+
+# Latest block number, re-read from the node at most once per BLOCK_NUMBER_TTL seconds
+BLOCK_NUMBER_TTL = float(os.environ.get('BLOCK_NUMBER_TTL', 1.0))
+block_number_cache = {'value': None, 'read_at': 0.0}
 
 def load_contract():
     global CONTRACT_ADDRESS, CONTRACT_ABI, contract
@@ -61,11 +213,369 @@ def load_contract():
                 CONTRACT_ADDRESS = networks[network_id]['address']
                 contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
                 print(f"✅ Contract loaded at: {CONTRACT_ADDRESS}")
+                load_multicall()
+                load_event_index()
                 return True
     except Exception as e:
         print(f"❌ Contract not loaded: {e}")
         return False
 
+def load_multicall():
+    global multicall
+    try:
+        address = Web3.to_checksum_address(MULTICALL3_ADDRESS)
+        if w3.eth.get_code(address):
+            multicall = w3.eth.contract(address=address, abi=MULTICALL3_ABI)
+            print(f"✅ Multicall3 found at: {address}")
+        else:
+            print("⚠️ Multicall3 not deployed - contract reads will use JSON-RPC batches")
+    except Exception as e:
+        print(f"⚠️ Multicall3 unavailable: {e}")
+
+def current_block():
+    """Latest block number, shared by all requests within BLOCK_NUMBER_TTL seconds"""
+    now = time.monotonic()
+    if block_number_cache['value'] is None or now - block_number_cache['read_at'] >= BLOCK_NUMBER_TTL:
+        block_number_cache['value'] = w3.eth.block_number
+        block_number_cache['read_at'] = now
+    return block_number_cache['value']
+
+@lru_cache(maxsize=1)
+def _total_counts(contract_address, block_number):
+    return contract.functions.getTotalCounts().call()
+
+def get_total_counts():
+    """getTotalCounts() as of the latest block, read from the contract once per block"""
+    try:
+        block_number = current_block()
+    except Exception as e:
+        print(f"⚠️ Could not read block number, reading counts directly: {e}")
+        return contract.functions.getTotalCounts().call()
+    return _total_counts(contract.address, block_number)
+
+def batch_call(fn_name, ids):
+    """Read contract.<fn_name>(i) for every id; returns decoded rows in order, None where a read failed"""
+    ids = list(ids)
+    try:
+        block_number = current_block()
+    except Exception as e:
+        print(f"⚠️ Could not read block number, bypassing row cache: {e}")
+        return fetch_rows(fn_name, ids)
+    
+    events_synced = sync_contract_events(block_number)
+    
+    rows = {}
+    missing = []
+    for i in ids:
+        cached = get_cached_row((contract.address, fn_name, i))
+        if cached is not None and is_fresh_row(fn_name, i, cached, block_number, events_synced):
+            rows[i] = cached[1]
+        else:
+            missing.append(i)
+    
+    for i, row in zip(missing, fetch_rows(fn_name, missing)):
+        rows[i] = row
+        if row is not None:
+            put_cached_row((contract.address, fn_name, i), (block_number, row))
+    
+    return [rows[i] for i in ids]
+
+def get_cached_row(key):
+    with row_cache_lock:
+        cached = row_cache.get(key)
+        if cached is not None:
+            row_cache.move_to_end(key)
+        return cached
+
+def put_cached_row(key, cached):
+    with row_cache_lock:
+        row_cache[key] = cached
+        row_cache.move_to_end(key)
+        while len(row_cache) > ROW_CACHE_SIZE:
+            row_cache.popitem(last=False)
+
+def is_fresh_row(fn_name, i, cached, block_number, events_synced):
+    """A cached row is fresh if no block was mined since, it is final, or no event has touched it since"""
+    cached_block, row = cached
+    if cached_block == block_number:
+        return True
+    
+    # Rows in a terminal state never change on-chain
+    if is_final_row(fn_name, row):
+        return True
+    
+    if events_synced:
+        touched = event_index['touched']
+        last_event = max(touched.get((fn_name, i), -1), touched.get((fn_name, '*'), -1))
+        return last_event <= cached_block
+    return False
+
+def is_final_row(fn_name, row):
+    final = FINAL_ROW_STATUS.get(fn_name)
+    return final is not None and getattr(row, final[0]) in final[1]
+
+def chain_id_hash():
+    """Genesis block hash, so a saved row cache is never applied to a different or reset chain"""
+    return bytes(w3.eth.get_block(0)['hash']).hex()
+
+def save_row_cache():
+    """Write the final rows of the row cache to ROW_CACHE_FILE"""
+    if contract is None:
+        return
+    try:
+        with row_cache_lock:
+            entries = list(row_cache.items())
+        # [contract address, fn name, id, block number, row fields]
+        rows = [
+            [*key, cached[0], list(cached[1])]
+            for key, cached in entries if is_final_row(key[1], cached[1])
+        ]
+        # Stdlib json: uint256 fields may not fit orjson's 64-bit integers
+        tmp_path = f"{ROW_CACHE_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'chain': chain_id_hash(), 'rows': rows}, f)
+        os.replace(tmp_path, ROW_CACHE_FILE)
+        print(f"✅ Saved {len(rows)} final rows to {ROW_CACHE_FILE}")
+    except Exception as e:
+        print(f"⚠️ Error saving row cache: {e}")
+
+def restore_row_cache():
+    """Load final rows saved by a previous run on the same chain"""
+    try:
+        if not os.path.exists(ROW_CACHE_FILE):
+            return
+        with open(ROW_CACHE_FILE, 'r') as f:
+            state = json.load(f)
+        if state.get('chain') != chain_id_hash():
+            print("⚠️ Saved row cache is from another chain - ignoring it")
+            return
+        restored = 0
+        for address, fn_name, i, block_number, fields in state.get('rows', []):
+            row_type = ROW_TYPES.get(fn_name)
+            if row_type is None or len(fields) != len(row_type._fields):
+                continue
+            row = row_type(*fields)
+            # Only settled rows are trusted without a re-read
+            if is_final_row(fn_name, row):
+                put_cached_row((address, fn_name, i), (block_number, row))
+                restored += 1
+        print(f"✅ Restored {restored} final rows from {ROW_CACHE_FILE}")
+    except Exception as e:
+        print(f"⚠️ Error loading row cache: {e}")
+
+atexit.register(save_row_cache)
+
+def load_event_index():
+    """Index the contract's claim/policy events so cached rows are only re-read when an event touches them"""
+    topics = {}
+    for entry in CONTRACT_ABI:
+        if entry.get('type') != 'event':
+            continue
+        name = entry['name'].lower()
+        for marker, fn_name in EVENT_ROW_TABLES:
+            if marker in name:
+                topics[event_abi_to_log_topic(entry)] = (entry['name'], fn_name)
+                break
+    
+    with event_index_lock:
+        # Rows cached before this point were never covered by the index; final rows are always valid
+        with row_cache_lock:
+            row_cache.clear()
+        restore_row_cache()
+        event_index['topics'] = topics
+        event_index['touched'] = {}
+        event_index['synced_block'] = None
+        if topics:
+            event_index['synced_block'] = w3.eth.block_number
+            print(f"✅ Indexing {len(topics)} claim/policy events")
+        else:
+            print("⚠️ No claim/policy events in ABI - cached rows expire every block")
+    
+    # Taken separately: owned_rows may hold owner_index_lock while a read syncs events
+    with owner_index_lock:
+        owner_index.clear()
+
+def sync_contract_events(block_number):
+    """Apply contract events up to block_number to the index; returns False when the index is unavailable"""
+    with event_index_lock:
+        synced_block = event_index['synced_block']
+        if synced_block is None:
+            return False
+        if synced_block >= block_number:
+            return True
+        
+        try:
+            logs = w3.eth.get_logs({
+                'address': contract.address,
+                'fromBlock': synced_block + 1,
+                'toBlock': block_number
+            })
+        except Exception as e:
+            print(f"⚠️ Could not read contract events: {e}")
+            return False
+        
+        touched = event_index['touched']
+        for log in logs:
+            if not log['topics'] or log['topics'][0] not in event_index['topics']:
+                continue
+            event_name, fn_name = event_index['topics'][log['topics'][0]]
+            try:
+                args = getattr(contract.events, event_name)().process_log(log)['args']
+                row_id = next((args[name] for name in EVENT_ID_ARGS if name in args), '*')
+            except Exception:
+                row_id = '*'
+            # '*' marks every row of the table as touched when the event carries no id
+            touched[(fn_name, row_id)] = log['blockNumber']
+        
+        event_index['synced_block'] = block_number
+        return True
+
+def owned_rows(fn_name, field, owners, total):
+    """Existing rows of fn_name whose field matches one of owners; only new ids and owned ids are read"""
+    fields = OWNER_INDEX_FIELDS[fn_name]
+    key = (contract.address, fn_name)
+    
+    with owner_index_lock:
+        index = owner_index.get(key)
+        if index is None or index['scanned'] > total:
+            index = owner_index[key] = {'scanned': 0, **{name: {} for name in fields}}
+        scanned = index['scanned']
+    
+    # Rows added since the last scan are read once to extend the index; the
+    # lock is not held across the reads so listings never queue behind RPCs
+    new_ids = range(scanned + 1, total + 1)
+    new_rows = batch_call(fn_name, new_ids) if new_ids else []
+    
+    with owner_index_lock:
+        # Another request extended (or a reload reset) the index meanwhile
+        if owner_index.get(key) is index and index['scanned'] == scanned:
+            for i, row in zip(new_ids, new_rows):
+                if row is None:
+                    break  # Retried on the next request
+                if row.exists:
+                    for name, lowercase in fields.items():
+                        owner = getattr(row, name)
+                        if lowercase:
+                            owner = owner.lower()
+                        index[name].setdefault(owner, []).append(i)
+                index['scanned'] = i
+        
+        by_owner = index[field]
+        ids = sorted({i for owner in owners for i in by_owner.get(owner, ())})
+    
+    return [row for row in batch_call(fn_name, ids) if row is not None and row.exists]
+
+def fetch_rows(fn_name, ids):
+    """Fetch and decode contract.<fn_name>(i) rows from the node, bypassing the row cache"""
+    outputs = contract.get_function_by_name(fn_name).abi['outputs']
+    output_types = [output['type'] for output in outputs]
+    row_type = ROW_TYPES[fn_name]
+    
+    rows = []
+    for start in range(0, len(ids), MULTICALL_CHUNK_SIZE):
+        chunk = ids[start:start + MULTICALL_CHUNK_SIZE]
+        call_data = [contract.encodeABI(fn_name=fn_name, args=[i]) for i in chunk]
+        
+        if multicall is not None:
+            results = multicall.functions.tryAggregate(
+                False, [(contract.address, data) for data in call_data]
+            ).call()
+        else:
+            try:
+                results = json_rpc_batch_call(call_data)
+            except Exception as e:
+                print(f"⚠️ JSON-RPC batch failed, reading {fn_name} in parallel: {e}")
+                results = list(rpc_executor.map(single_eth_call, call_data))
+        
+        for i, (success, return_data) in zip(chunk, results):
+            if not success:
+                print(f"❌ Error loading {fn_name}({i}): {return_data or 'call reverted'}")
+                rows.append(None)
+                continue
+            try:
+                values = w3.codec.decode(output_types, return_data)
+                # Match .call(), which returns checksummed addresses
+                rows.append(row_type(*[
+                    checksum_address(value) if output_type == 'address' else value
+                    for output_type, value in zip(output_types, values)
+                ]))
+            except Exception as e:
+                print(f"❌ Error decoding {fn_name}({i}): {e}")
+                rows.append(None)
+    return rows
+
+@lru_cache(maxsize=4096)
+def checksum_address(address):
+    """Web3.to_checksum_address, memoized - the same few hospital and insurer addresses recur on every row"""
+    return Web3.to_checksum_address(address)
+
+def single_eth_call(data):
+    """One eth_call to the contract; returns a (success, bytes or error message) pair"""
+    try:
+        return True, w3.eth.call({'to': contract.address, 'data': data})
+    except Exception as e:
+        return False, str(e)
+
+def json_rpc_batch_call(call_data):
+    """Send one eth_call per payload to the contract in a single JSON-RPC batch; returns (success, bytes) pairs"""
+    payload = [
+        {'jsonrpc': '2.0', 'id': idx, 'method': 'eth_call',
+         'params': [{'to': contract.address, 'data': data}, 'latest']}
+        for idx, data in enumerate(call_data)
+    ]
+    response = rpc_session.post(w3.provider.endpoint_uri, json=payload, timeout=30)
+    response.raise_for_status()
+    replies = response.json()
+    if not isinstance(replies, list):
+        raise ValueError(replies.get('error', 'node does not support batch requests'))
+    
+    # Batch replies may come back in any order
+    results = [(False, None)] * len(call_data)
+    for reply in replies:
+        if 'error' in reply:
+            results[reply['id']] = (False, reply['error'].get('message'))
+        else:
+            results[reply['id']] = (True, bytes.fromhex(reply['result'][2:]))
+    return results
+
+def int_column(values):
+    """int64 column, falling back to Python ints for uint256 values that overflow it"""
+    try:
+        return np.array(values, dtype=np.int64)
+    except OverflowError:
+        return np.array(values, dtype=object)
+
+# Policy and claim statuses as small integer codes so status filters compare int8s, not strings;
+# 0 is any status not listed here
+STATUS_CODE = {'ACTIVE': 1, 'APPROVED': 2, 'PENDING': 3, 'REJECTED': 4}
+
+def status_column(rows):
+    return np.fromiter((STATUS_CODE.get(row.status, 0) for row in rows), dtype=np.int8, count=len(rows))
+
+def policies_soa(policy_rows):
+    """Columnar (structure-of-arrays) view of existing policy rows"""
+    rows = [policy for policy in policy_rows if policy is not None and policy.exists]
+    return {
+        'id': int_column([policy.id for policy in rows]),
+        'did': np.array([policy.did for policy in rows], dtype=str),
+        'coverage': int_column([policy.coverageAmount for policy in rows]),
+        'createdBy': np.char.lower(np.array([policy.createdBy for policy in rows], dtype=str)),
+        'status': status_column(rows)
+    }
+
+def claims_soa(claim_rows):
+    """Columnar (structure-of-arrays) view of existing claim rows"""
+    rows = [claim for claim in claim_rows if claim is not None and claim.exists]
+    return {
+        'id': int_column([claim.id for claim in rows]),
+        'policyId': int_column([claim.policyId for claim in rows]),
+        'did': np.array([claim.did for claim in rows], dtype=str),
+        'amount': int_column([claim.amount for claim in rows]),
+        'submittedBy': np.char.lower(np.array([claim.submittedBy for claim in rows], dtype=str)),
+        'status': status_column(rows),
+        'isFraudulent': np.fromiter((claim.isFraudulent for claim in rows), dtype=bool, count=len(rows))
+    }
+
 # Authentication decorator
 def login_required(f):
     @wraps(f)
@@ -136,8 +646,14 @@ def login():
                 'username': user[0],
                 'role': user[1],
                 'name': user[2],
-                'wallet_address': address.lower()
+                'wallet_address': address.lower(),
+                'wallet_address_checksum': checksum_address
             }
+            if user[1] == 'patient':
+                try:
+                    session_did()
+                except Exception:
+                    pass  # Identity not created yet - looked up again on first use
             return jsonify({
                 'message': 'Login successful',
                 'user': session['user']
@@ -146,6 +662,38 @@ def login():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/auth/refresh-did', methods=['POST'])
+@role_required(['patient'])
+def refresh_did():
+    """Re-read the patient's DID from the blockchain, e.g. after creating a new identity"""
+    session['user'].pop('did', None)
+    session.modified = True
+    try:
+        return jsonify({'did': session_did()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 404
+
+def session_address():
+    """Checksummed wallet address of the logged-in user, computed once per session"""
+    user = session['user']
+    if not user.get('wallet_address_checksum'):
+        user['wallet_address_checksum'] = Web3.to_checksum_address(user['wallet_address'])
+        session.modified = True
+    return user['wallet_address_checksum']
+
+def session_did():
+    """DID of the logged-in patient, cached in the session after the first getMyIdentity call"""
+    user = session['user']
+    if user.get('did'):
+        return user['did']
+    
+    address = session_address()
+    did = contract.functions.getMyIdentity().call({'from': address})[0]
+    if did:
+        user['did'] = did
+        session.modified = True
+    return did
+
 @app.route('/api/auth/logout', methods=['POST'])
 def logout():
     """Logout user"""
@@ -175,13 +723,13 @@ def create_identity():
     )
     
     return jsonify({
-        'did': identity_data['did'],
+        'did': identity_data.did,
         'name': data.get('name'),
         'email': data.get('email'),
         'idNumber': data.get('idNumber'),
         'dateOfBirth': data.get('dateOfBirth'),
-        'credential': identity_data['verifiable_credential'],
-        'publicKey': identity_data['public_key']
+        'credential': identity_data.verifiable_credential,
+        'publicKey': identity_data.public_key
     })
 
 @app.route('/api/ssi/my-identity', methods=['GET'])
@@ -189,7 +737,7 @@ def create_identity():
 def get_my_identity():
     """Get current user's identity from blockchain"""
     try:
-        address = Web3.to_checksum_address(session['user']['wallet_address'])
+        address = session_address()
         identity_data = contract.functions.getMyIdentity().call({'from': address})
         
         return jsonify({
@@ -237,7 +785,6 @@ def prepare_policy():
     """Prepare policy data for blockchain submission"""
     data = request.json
     
-    import random
     policy_number = f"POL{random.randint(100000, 999999)}"
     
     insurance_company_name = session['user'].get('name', 'Unknown Insurance')
@@ -259,72 +806,63 @@ def get_policies():
     """Get policies from blockchain with proper filtering"""
     try:
         current_user = session['user']
-        current_address = Web3.to_checksum_address(current_user['wallet_address'])
         
-        counts = contract.functions.getTotalCounts().call()
+        counts = get_total_counts()
         total_policies = counts[2]
         
-        policies = []
-        
-        for i in range(1, total_policies + 1):
+        # Patients and insurers read only their own policies through the owner index
+        role = current_user['role']
+        my_address = current_user['wallet_address'].lower()
+        my_did = None
+        if role == 'patient':
             try:
-                policy_data = contract.functions.policies(i).call()
-                
-                if not policy_data[12]:
-                    continue
-                
-                policy = {
-                    'id': policy_data[0],
-                    'policyNumber': policy_data[1],
-                    'did': policy_data[2],
-                    'patientName': policy_data[3],
-                    'policyType': policy_data[4],
-                    'coverageAmount': str(policy_data[5]),
-                    'premium': str(policy_data[6]),
-                    'durationMonths': policy_data[7],
-                    'createdBy': policy_data[8],
-                    'insuranceCompany': policy_data[9],
-                    'status': policy_data[10],
-                    'createdAt': datetime.fromtimestamp(policy_data[11]).isoformat()
-                }
-                
-                try:
-                    from dateutil.relativedelta import relativedelta
-                    created = datetime.fromtimestamp(policy_data[11])
-                    expiry = created + relativedelta(months=policy_data[7])
-                    policy['expiryDate'] = expiry.isoformat()
-                except:
-                    pass
-                
-                if current_user['role'] == 'patient':
-                    try:
-                        my_identity = contract.functions.getMyIdentity().call({'from': current_address})
-                        my_did = my_identity[0]
-                        if policy['did'] == my_did:
-                            policies.append(policy)
-                    except:
-                        pass
-                        
-                elif current_user['role'] == 'insurance':
-                    if policy['createdBy'].lower() == current_address.lower():
-                        policies.append(policy)
-                        
-                elif current_user['role'] == 'hospital':
-                    if policy['status'] == 'ACTIVE':
-                        policies.append(policy)
-                        
-                else:
-                    policies.append(policy)
-                    
-            except Exception as e:
-                print(f"❌ Error loading policy {i}: {e}")
-                continue
+                my_did = session_did()
+            except Exception:
+                pass
+            policy_rows = owned_rows('policies', 'did', [my_did], total_policies) if my_did else []
+        elif role == 'insurance':
+            policy_rows = owned_rows('policies', 'createdBy', [my_address], total_policies)
+        else:
+            policy_rows = batch_call('policies', range(1, total_policies + 1))
+        
+        # Role filter as one boolean mask over the columns of the existing rows
+        policy_rows = [policy for policy in policy_rows if policy is not None and policy.exists]
+        columns = policies_soa(policy_rows)
+        if role == 'patient':
+            mask = columns['did'] == my_did
+        elif role == 'insurance':
+            mask = columns['createdBy'] == my_address
+        elif role == 'hospital':
+            mask = columns['status'] == STATUS_CODE['ACTIVE']
+        else:
+            mask = np.ones(len(policy_rows), dtype=bool)
+        
+        policies = [policy_json(policy_rows[idx]) for idx in np.flatnonzero(mask)]
         
         return jsonify(policies)
     except Exception as e:
         print(f"❌ Error in get_policies: {e}")
         return jsonify({'error': str(e)}), 500
 
+def policy_json(policy_data):
+    """API representation of one decoded policy row"""
+    created = datetime.fromtimestamp(policy_data.createdAt)
+    return {
+        'id': policy_data.id,
+        'policyNumber': policy_data.policyNumber,
+        'did': policy_data.did,
+        'patientName': policy_data.patientName,
+        'policyType': policy_data.policyType,
+        'coverageAmount': str(policy_data.coverageAmount),
+        'premium': str(policy_data.premium),
+        'durationMonths': policy_data.durationMonths,
+        'createdBy': policy_data.createdBy,
+        'insuranceCompany': policy_data.insuranceCompany,
+        'status': policy_data.status,
+        'createdAt': created.isoformat(),
+        'expiryDate': (created + relativedelta(months=policy_data.durationMonths)).isoformat()
+    }
+
 @app.route('/api/policies/search', methods=['GET'])
 @role_required(['hospital', 'insurance'])
 def search_policies():
@@ -332,32 +870,26 @@ def search_policies():
     did = request.args.get('did')
     
     try:
-        counts = contract.functions.getTotalCounts().call()
+        counts = get_total_counts()
         total_policies = counts[2]
         
-        policies = []
-        for i in range(1, total_policies + 1):
-            try:
-                policy_data = contract.functions.policies(i).call()
-                
-                if not policy_data[12]:
-                    continue
-                
-                if did and policy_data[2] == did and policy_data[10] == 'ACTIVE':
-                    policies.append({
-                        'id': policy_data[0],
-                        'policyNumber': policy_data[1],
-                        'did': policy_data[2],
-                        'patientName': policy_data[3],
-                        'policyType': policy_data[4],
-                        'coverageAmount': str(policy_data[5]),
-                        'premium': str(policy_data[6]),
-                        'status': policy_data[10],
-                        'insuranceCompany': policy_data[9],
-                        'durationMonths': policy_data[7]
-                    })
-            except:
-                continue
+        # Policies carrying this DID come straight from the owner index
+        policies = [
+            {
+                'id': policy_data.id,
+                'policyNumber': policy_data.policyNumber,
+                'did': policy_data.did,
+                'patientName': policy_data.patientName,
+                'policyType': policy_data.policyType,
+                'coverageAmount': str(policy_data.coverageAmount),
+                'premium': str(policy_data.premium),
+                'status': policy_data.status,
+                'insuranceCompany': policy_data.insuranceCompany,
+                'durationMonths': policy_data.durationMonths
+            }
+            for policy_data in (owned_rows('policies', 'did', [did], total_policies) if did else [])
+            if policy_data.status == 'ACTIVE'
+        ]
         
         return jsonify(policies)
     except Exception as e:
@@ -365,6 +897,15 @@ def search_policies():
 
 # ==================== CLAIMS ENDPOINTS ====================
 
+def read_upload(file, chunk_size=64 * 1024):
+    """Read an uploaded file in chunks, hashing as it streams; returns (bytes, sha256 hex)"""
+    digest = hashlib.sha256()
+    buf = io.BytesIO()
+    while chunk := file.stream.read(chunk_size):
+        digest.update(chunk)
+        buf.write(chunk)
+    return buf.getvalue(), digest.hexdigest()
+
 @app.route('/api/claims/prepare', methods=['POST'])
 @role_required(['hospital'])
 def prepare_claim():
@@ -380,24 +921,23 @@ def prepare_claim():
             uploaded_files = request.files.getlist('proofFiles')
             for file in uploaded_files:
                 if file and file.filename:
-                    file_data = file.read()
+                    file_data, file_hash = read_upload(file)
                     files.append({
                         'filename': file.filename,
-                        'data': base64.b64encode(file_data).decode('utf-8'),
+                        'data': file_data,
                         'mimetype': file.mimetype,
-                        'size': len(file_data)
+                        'size': len(file_data),
+                        'sha256': file_hash
                     })
         
         # AI prediction with Gemini
         prediction = fraud_model.predict_fraud_with_gemini(data, files)
         
         # Generate claim number
-        import random
         claim_number = f"CLM{random.randint(100000, 999999)}"
         
         # Cache Gemini analysis and files
-        gemini_analysis_cache[claim_number] = prediction.get('gemini_analysis', '')
-        claim_files_cache[claim_number] = files
+        claim_store.put(claim_number, prediction.get('gemini_analysis', ''), files)
         
         # Return data for blockchain submission (removed ML fraud type)
         return jsonify({
@@ -418,9 +958,10 @@ def prepare_claim():
             'mlConfidence': 0,  # No ML model
             'proofFilesCount': len(files)
         })
+    except RequestEntityTooLarge:
+        return jsonify({'error': f"Upload exceeds {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB"}), 413
     except Exception as e:
         print(f"❌ Error in prepare_claim: {e}")
-        import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
@@ -430,96 +971,139 @@ def get_claims():
     """Get claims from blockchain"""
     try:
         current_user = session['user']
-        current_address = Web3.to_checksum_address(current_user['wallet_address'])
         
-        counts = contract.functions.getTotalCounts().call()
+        counts = get_total_counts()
         total_claims = counts[3]
         
-        claims = []
-        
-        for i in range(1, total_claims + 1):
+        # Each role reads only its own claims through the owner index
+        role = current_user['role']
+        my_address = current_user['wallet_address'].lower()
+        if role == 'patient':
             try:
-                claim_data = contract.functions.claims(i).call()
-                
-                if not claim_data[21]:
-                    continue
-                
-                claim = {
-                    'id': claim_data[0],
-                    'claimNumber': claim_data[1],
-                    'policyId': claim_data[2],
-                    'policyNumber': claim_data[3],
-                    'did': claim_data[4],
-                    'patientName': claim_data[5],
-                    'claimType': claim_data[6],
-                    'amount': int(claim_data[7]),
-                    'description': claim_data[8],
-                    'hospitalName': claim_data[9],
-                    'diagnosis': claim_data[10],
-                    'submittedBy': claim_data[11],
-                    'submittedAt': datetime.fromtimestamp(claim_data[12]).isoformat(),
-                    'status': claim_data[13],
-                    'fraudScore': claim_data[14] / 100.0,
-                    'isFraudulent': claim_data[15],
-                    'aiDecision': claim_data[16],
-                    'mlFraudType': claim_data[17] if len(claim_data) > 17 else 'N/A',
-                    'mlConfidence': claim_data[18] if len(claim_data) > 18 else 0,
-                    'processedAt': datetime.fromtimestamp(claim_data[19]).isoformat() if claim_data[19] > 0 else None,
-                    'processedBy': claim_data[20] if claim_data[20] != '0x0000000000000000000000000000000000000000' else None
-                }
-                
-                claim_number = claim['claimNumber']
-                if claim_number in gemini_analysis_cache:
-                    claim['geminiAnalysis'] = gemini_analysis_cache[claim_number]
-                if claim_number in claim_files_cache:
-                    claim['proofFiles'] = claim_files_cache[claim_number]
-                
-                try:
-                    policy_data = contract.functions.policies(claim['policyId']).call()
-                    claim['insuranceCompanyAddress'] = policy_data[8]
-                except:
-                    pass
-                
-                should_include = False
-                
-                if current_user['role'] == 'patient':
-                    try:
-                        my_identity = contract.functions.getMyIdentity().call({'from': current_address})
-                        my_did = my_identity[0]
-                        if claim['did'] == my_did:
-                            should_include = True
-                    except:
-                        pass
-                
-                elif current_user['role'] == 'hospital':
-                    if claim['submittedBy'].lower() == current_address.lower():
-                        claim['fraudScore'] = 0
-                        claim['isFraudulent'] = False
-                        claim['geminiAnalysis'] = ''
-                        claim['aiDecision'] = 'PENDING'
-                        claim['mlFraudType'] = 'HIDDEN'
-                        claim['mlConfidence'] = 0
-                        should_include = True
-                
-                elif current_user['role'] == 'insurance':
-                    if 'insuranceCompanyAddress' in claim and claim['insuranceCompanyAddress'].lower() == current_address.lower():
-                        should_include = True
-                
-                else:
-                    should_include = True
-                
-                if should_include:
-                    claims.append(claim)
-                    
-            except Exception as e:
-                print(f"❌ Error processing claim {i}: {e}")
-                continue
+                claim_rows = owned_rows('claims', 'did', [session_did()], total_claims)
+            except Exception:
+                claim_rows = []
+        elif role == 'hospital':
+            claim_rows = owned_rows('claims', 'submittedBy', [my_address], total_claims)
+        elif role == 'insurance':
+            my_policies = owned_rows('policies', 'createdBy', [my_address], counts[2])
+            claim_rows = owned_rows('claims', 'policyId', [policy.id for policy in my_policies], total_claims)
+        else:
+            claim_rows = [
+                row for row in batch_call('claims', range(1, total_claims + 1))
+                if row is not None and row.exists
+            ]
+        
+        # Insurer of each claim's policy, read in one batch
+        policy_ids = sorted({claim_data.policyId for claim_data in claim_rows})
+        policy_owners = {
+            policy_id: policy_data.createdBy
+            for policy_id, policy_data in zip(policy_ids, batch_call('policies', policy_ids))
+            if policy_data is not None
+        }
+        
+        # Gemini analysis and file metadata for every listed claim in one lookup
+        stored = claim_store.analyses(claim_data.claimNumber for claim_data in claim_rows)
+        
+        claims = []
+        for claim_data in claim_rows:
+            claim = {
+                'id': claim_data.id,
+                'claimNumber': claim_data.claimNumber,
+                'policyId': claim_data.policyId,
+                'policyNumber': claim_data.policyNumber,
+                'did': claim_data.did,
+                'patientName': claim_data.patientName,
+                'claimType': claim_data.claimType,
+                'amount': int(claim_data.amount),
+                'description': claim_data.description,
+                'hospitalName': claim_data.hospitalName,
+                'diagnosis': claim_data.diagnosis,
+                'submittedBy': claim_data.submittedBy,
+                'submittedAt': datetime.fromtimestamp(claim_data.submittedAt).isoformat(),
+                'status': claim_data.status,
+                'fraudScore': claim_data.fraudScore / 100.0,
+                'isFraudulent': claim_data.isFraudulent,
+                'aiDecision': claim_data.aiDecision,
+                'mlFraudType': claim_data.mlFraudType,
+                'mlConfidence': claim_data.mlConfidence,
+                'processedAt': datetime.fromtimestamp(claim_data.processedAt).isoformat() if claim_data.processedAt > 0 else None,
+                'processedBy': claim_data.processedBy if claim_data.processedBy != '0x0000000000000000000000000000000000000000' else None
+            }
+            
+            claim_number = claim['claimNumber']
+            if claim_number in stored:
+                analysis, file_meta = stored[claim_number]
+                claim['geminiAnalysis'] = analysis
+                # Metadata only - file bytes are served by get_claim_file
+                claim['proofFiles'] = [
+                    {
+                        'filename': file_info['filename'],
+                        'mimetype': file_info['mimetype'],
+                        'size': file_info['size'],
+                        'url': f"/api/claims/{claim_number}/files/{file_idx}"
+                    }
+                    for file_idx, file_info in enumerate(file_meta)
+                ]
+            
+            if claim['policyId'] in policy_owners:
+                claim['insuranceCompanyAddress'] = policy_owners[claim['policyId']]
+            
+            if role == 'hospital':
+                claim['fraudScore'] = 0
+                claim['isFraudulent'] = False
+                claim['geminiAnalysis'] = ''
+                claim['aiDecision'] = 'PENDING'
+                claim['mlFraudType'] = 'HIDDEN'
+                claim['mlConfidence'] = 0
+            
+            claims.append(claim)
         
         return jsonify(claims)
     except Exception as e:
         print(f"❌ Error in get_claims: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/claims/<claim_number>/files/<int:idx>', methods=['GET'])
+@login_required
+def get_claim_file(claim_number, idx):
+    """Serve one uploaded proof file as raw bytes"""
+    stored = claim_store.file(claim_number, idx)
+    if stored is None:
+        return jsonify({'error': 'File not found'}), 404
+    
+    try:
+        # The owner index maps claim numbers to ids, so only this claim's row is read
+        counts = get_total_counts()
+        claim_data = next(iter(owned_rows('claims', 'claimNumber', [claim_number], counts[3])), None)
+        if claim_data is None or not can_view_claim(claim_data):
+            return jsonify({'error': 'File not found'}), 404
+    except Exception as e:
+        print(f"❌ Error in get_claim_file: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    file_info, file_data = stored
+    return send_file(
+        io.BytesIO(file_data),
+        mimetype=file_info['mimetype'],
+        download_name=file_info['filename']
+    )
+
+def can_view_claim(claim_data):
+    """Same visibility rules as get_claims, for a single claim row"""
+    current_user = session['user']
+    my_address = current_user['wallet_address'].lower()
+    role = current_user['role']
+    
+    if role == 'patient':
+        return claim_data.did == session_did()
+    if role == 'hospital':
+        return claim_data.submittedBy.lower() == my_address
+    if role == 'insurance':
+        policy_data = Policy(*contract.functions.policies(claim_data.policyId).call())
+        return policy_data.createdBy.lower() == my_address
+    return True
+
 # ==================== FEDERATED LEARNING ====================
 
 @app.route('/api/federated-learning/status', methods=['GET'])
@@ -538,6 +1122,35 @@ def fl_status():
     
     return jsonify(status)
 
+def fetch_fl_claims():
+    """All existing claims in the shape fl_system.train_round expects; memoized per block"""
+    block_number = current_block()
+    if fl_claims_cache['block'] == block_number:
+        return fl_claims_cache['claims']
+    
+    counts = get_total_counts()
+    total_claims = counts[3]
+    print(f"📊 Fetching {total_claims} claims from blockchain...")
+    
+    claims = [
+        {
+            'id': claim_data.id,
+            'claimNumber': claim_data.claimNumber,
+            'amount': int(claim_data.amount),
+            'description': claim_data.description,
+            'claimType': claim_data.claimType,
+            'status': claim_data.status,
+            'fraudScore': claim_data.fraudScore / 100.0,
+            'mlConfidence': 0  # No ML model
+        }
+        for claim_data in batch_call('claims', range(1, total_claims + 1))
+        if claim_data is not None and claim_data.exists  # Failed reads and missing rows are skipped up front
+    ]
+    
+    fl_claims_cache['block'] = block_number
+    fl_claims_cache['claims'] = claims
+    return claims
+
 @app.route('/api/federated-learning/prepare-train', methods=['POST', 'OPTIONS'])
 def fl_prepare_train():
     """Prepare federated learning training WITHOUT blockchain recording (frontend will handle that)"""
@@ -563,36 +1176,7 @@ def fl_prepare_train():
         print("="*60)
         
         # Get all claims from blockchain
-        counts = contract.functions.getTotalCounts().call()
-        total_claims = counts[3]
-        
-        print(f"📊 Fetching {total_claims} claims from blockchain...")
-        
-        claims = []
-        for i in range(1, total_claims + 1):
-            try:
-                claim_data = contract.functions.claims(i).call()
-                
-                if not claim_data[21]:  # exists check
-                    continue
-                
-                claim = {
-                    'id': claim_data[0],
-                    'claimNumber': claim_data[1],
-                    'amount': int(claim_data[7]),
-                    'description': claim_data[8],
-                    'claimType': claim_data[6],
-                    'status': claim_data[13],
-                    'fraudScore': claim_data[14] / 100.0,
-                    'mlConfidence': 0  # No ML model
-                }
-                
-                claims.append(claim)
-                
-            except Exception as e:
-                print(f"⚠️ Error loading claim {i}: {e}")
-                continue
-        
+        claims = fetch_fl_claims()
         print(f"✅ Loaded {len(claims)} claims from blockchain")
         
         # Count approved/rejected claims
@@ -626,7 +1210,6 @@ def fl_prepare_train():
         
     except Exception as e:
         print(f"❌ Error in federated learning: {e}")
-        import traceback
         traceback.print_exc()
         return jsonify({
             'success': False,
@@ -644,36 +1227,7 @@ def fl_train():
         print("="*60)
         
         # Get all claims from blockchain
-        counts = contract.functions.getTotalCounts().call()
-        total_claims = counts[3]
-        
-        print(f"📊 Fetching {total_claims} claims from blockchain...")
-        
-        claims = []
-        for i in range(1, total_claims + 1):
-            try:
-                claim_data = contract.functions.claims(i).call()
-                
-                if not claim_data[21]:  # exists check
-                    continue
-                
-                claim = {
-                    'id': claim_data[0],
-                    'claimNumber': claim_data[1],
-                    'amount': int(claim_data[7]),
-                    'description': claim_data[8],
-                    'claimType': claim_data[6],
-                    'status': claim_data[13],
-                    'fraudScore': claim_data[14] / 100.0,
-                    'mlConfidence': 0  # No ML model
-                }
-                
-                claims.append(claim)
-                
-            except Exception as e:
-                print(f"⚠️ Error loading claim {i}: {e}")
-                continue
-        
+        claims = fetch_fl_claims()
         print(f"✅ Loaded {len(claims)} claims from blockchain")
         
         # Count approved/rejected claims
@@ -688,7 +1242,7 @@ def fl_train():
             try:
                 # Record training round on blockchain
                 current_user = session['user']
-                current_address = Web3.to_checksum_address(current_user['wallet_address'])
+                current_address = session_address()
                 
                 tx = contract.functions.recordTrainingRound(
                     int(result['global_accuracy'] * 100),
@@ -709,7 +1263,6 @@ def fl_train():
         
     except Exception as e:
         print(f"❌ Error in federated learning: {e}")
-        import traceback
         traceback.print_exc()
         return jsonify({
             'success': False,
@@ -746,32 +1299,47 @@ def fl_reset():
 
 # ==================== ANALYTICS ====================
 
+# Analytics row scope per role: (policy rows, claim rows) the caller may count
+
+def analytics_rows_patient(my_address, patient_did, total_policies, total_claims):
+    if not patient_did:
+        return [], []
+    return (owned_rows('policies', 'did', [patient_did], total_policies),
+            owned_rows('claims', 'did', [patient_did], total_claims))
+
+def analytics_rows_insurance(my_address, patient_did, total_policies, total_claims):
+    policy_rows = owned_rows('policies', 'createdBy', [my_address], total_policies)
+    return policy_rows, owned_rows('claims', 'policyId', [policy.id for policy in policy_rows], total_claims)
+
+def analytics_rows_hospital(my_address, patient_did, total_policies, total_claims):
+    return (batch_call('policies', range(1, total_policies + 1)),
+            owned_rows('claims', 'submittedBy', [my_address], total_claims))
+
+def analytics_rows_all(my_address, patient_did, total_policies, total_claims):
+    return (batch_call('policies', range(1, total_policies + 1)),
+            batch_call('claims', range(1, total_claims + 1)))
+
+ANALYTICS_SCOPES = {
+    'patient': analytics_rows_patient,
+    'insurance': analytics_rows_insurance,
+    'hospital': analytics_rows_hospital
+}
+
 @app.route('/api/analytics', methods=['GET'])
 @login_required
 def get_analytics():
     """Get analytics from blockchain with proper patient filtering"""
     try:
         current_user = session['user']
-        current_address = Web3.to_checksum_address(current_user['wallet_address'])
         
-        counts = contract.functions.getTotalCounts().call()
+        counts = get_total_counts()
         total_claims = counts[3]
         total_policies = counts[2]
         
-        fraudulent_count = 0
-        approved_count = 0
-        pending_count = 0
-        rejected_count = 0
-        active_policies = 0
-        total_coverage = 0
-        approved_amount = 0
-        pending_amount = 0
-        
         patient_did = None
         if current_user['role'] == 'patient':
             try:
-                my_identity = contract.functions.getMyIdentity().call({'from': current_address})
-                patient_did = my_identity[0]
+                patient_did = session_did()
                 print(f"📊 Patient DID for analytics: {patient_did}")
             except Exception as e:
                 print(f"⚠️ Could not get patient DID: {e}")
@@ -794,77 +1362,26 @@ def get_analytics():
                     'avg_processing_days': 0
                 })
         
-        for i in range(1, total_policies + 1):
-            try:
-                policy = contract.functions.policies(i).call()
-                if not policy[12]:
-                    continue
-                
-                should_count = False
-                
-                if current_user['role'] == 'patient':
-                    if patient_did and policy[2] == patient_did:
-                        should_count = True
-                elif current_user['role'] == 'insurance':
-                    if policy[8].lower() == current_address.lower():
-                        should_count = True
-                else:
-                    should_count = True
-                
-                if should_count:
-                    if policy[10] == "ACTIVE":
-                        active_policies += 1
-                        try:
-                            total_coverage += int(policy[5])
-                        except:
-                            pass
-                            
-            except Exception as e:
-                print(f"⚠️ Error processing policy {i}: {e}")
-                continue
+        # The role is fixed for the request, so pick its row scope once
+        scope = ANALYTICS_SCOPES.get(current_user['role'], analytics_rows_all)
+        policy_rows, claim_rows = scope(
+            current_user['wallet_address'].lower(), patient_did, total_policies, total_claims
+        )
+        policies = policies_soa(policy_rows)
+        claims = claims_soa(claim_rows)
         
-        for i in range(1, total_claims + 1):
-            try:
-                claim = contract.functions.claims(i).call()
-                if not claim[21]:
-                    continue
-                
-                should_count = False
-                
-                if current_user['role'] == 'patient':
-                    if patient_did and claim[4] == patient_did:
-                        should_count = True
-                elif current_user['role'] == 'hospital':
-                    if claim[11].lower() == current_address.lower():
-                        should_count = True
-                elif current_user['role'] == 'insurance':
-                    try:
-                        policy = contract.functions.policies(claim[2]).call()
-                        if policy[8].lower() == current_address.lower():
-                            should_count = True
-                    except:
-                        pass
-                else:
-                    should_count = True
-                
-                if should_count:
-                    if claim[15]:
-                        fraudulent_count += 1
-                    
-                    claim_amount = int(claim[7])
-                    
-                    if claim[13] == "APPROVED":
-                        approved_count += 1
-                        approved_amount += claim_amount
-                    elif claim[13] == "PENDING":
-                        pending_count += 1
-                        pending_amount += claim_amount
-                    elif claim[13] == "REJECTED":
-                        rejected_count += 1
-                        
-            except Exception as e:
-                print(f"⚠️ Error processing claim {i}: {e}")
-                continue
+        active_mask = policies['status'] == STATUS_CODE['ACTIVE']
+        active_policies = int(np.count_nonzero(active_mask))
+        total_coverage = int(policies['coverage'][active_mask].sum())
+        
+        # Per-status counts in one bincount over the claims' status codes
+        status_counts = np.bincount(claims['status'], minlength=len(STATUS_CODE) + 1)
+        approved_count = int(status_counts[STATUS_CODE['APPROVED']])
+        pending_count = int(status_counts[STATUS_CODE['PENDING']])
+        rejected_count = int(status_counts[STATUS_CODE['REJECTED']])
+        fraudulent_count = int(np.count_nonzero(claims['isFraudulent']))
+        approved_amount = int(claims['amount'][claims['status'] == STATUS_CODE['APPROVED']].sum())
+        pending_amount = int(claims['amount'][claims['status'] == STATUS_CODE['PENDING']].sum())
         
         total_counted_claims = approved_count + pending_count + rejected_count
         total_counted_policies = active_policies
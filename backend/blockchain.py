@@ -1,5 +1,5 @@
 import hashlib
-import json
+import orjson
 from datetime import datetime
 
 class CustomBlockchain:
@@ -24,15 +24,19 @@ class CustomBlockchain:
         genesis_block['hash'] = self.calculate_hash(genesis_block)
         self.chain.append(genesis_block)
     
-    def calculate_hash(self, block):
-        """Calculate SHA-256 hash of a block"""
-        block_string = json.dumps({
+    @staticmethod
+    def canonical_bytes(block):
+        """Canonical serialization of the hashed block fields"""
+        return orjson.dumps({
             'index': block['index'],
             'timestamp': block['timestamp'],
             'data': block['data'],
             'previous_hash': block['previous_hash']
-        }, sort_keys=True)
-        return hashlib.sha256(block_string.encode()).hexdigest()
+        }, option=orjson.OPT_SORT_KEYS)
+    
+    def calculate_hash(self, block):
+        """Calculate SHA-256 hash of a block"""
+        return hashlib.sha256(self.canonical_bytes(block)).hexdigest()
     
     def get_latest_block(self):
         """Get the most recent block"""
@@ -54,16 +58,16 @@ class CustomBlockchain:
     
     def is_chain_valid(self):
         """Validate the entire blockchain"""
-        for i in range(1, len(self.chain)):
-            current_block = self.chain[i]
-            previous_block = self.chain[i - 1]
-            
-            # Verify current block's hash
-            if current_block['hash'] != self.calculate_hash(current_block):
+        canonical_bytes = self.canonical_bytes
+        sha256 = hashlib.sha256
+        
+        for previous_block, current_block in zip(self.chain, self.chain[1:]):
+            # Verify link to previous block first - a string compare is cheaper than a re-hash
+            if current_block['previous_hash'] != previous_block['hash']:
                 return False
             
-            # Verify link to previous block
-            if current_block['previous_hash'] != previous_block['hash']:
+            # Verify current block's hash
+            if current_block['hash'] != sha256(canonical_bytes(current_block)).hexdigest():
                 return False
         
         return True
@@ -0,0 +1,139 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+import orjson
+
+try:
+    import redis  # Optional: shared claim store across gunicorn workers
+except ImportError:
+    redis = None
+
+# Process-wide claim store, created on first use
+_CLAIM_STORE = None
+_CLAIM_STORE_LOCK = threading.Lock()
+
+
+def get_claim_store():
+    """Return the shared claim store: Redis when REDIS_URL is set, otherwise in-process memory"""
+    global _CLAIM_STORE
+    if _CLAIM_STORE is None:
+        with _CLAIM_STORE_LOCK:
+            if _CLAIM_STORE is None:
+                ttl = int(os.environ.get('CLAIM_CACHE_TTL', 24 * 3600))
+                redis_url = os.environ.get('REDIS_URL')
+                if redis_url and redis is not None:
+                    _CLAIM_STORE = RedisClaimStore(redis_url, ttl)
+                    print("✅ Claim cache: Redis")
+                else:
+                    if redis_url:
+                        print("⚠️ REDIS_URL set but redis is not installed - using in-process claim cache")
+                    max_bytes = int(os.environ.get('CLAIM_CACHE_MAX_MB', 256)) * 1024 * 1024
+                    _CLAIM_STORE = MemoryClaimStore(ttl, max_bytes)
+    return _CLAIM_STORE
+
+
+def _file_metadata(files):
+    """Proof file descriptions without the file bytes"""
+    return [
+        {'filename': f['filename'], 'mimetype': f['mimetype'], 'size': f['size'], 'sha256': f.get('sha256')}
+        for f in files
+    ]
+
+
+class MemoryClaimStore:
+    """Gemini analysis and proof files per claim number, evicted by age and least-recent use"""
+
+    def __init__(self, ttl, max_bytes):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # claim number -> (expires at, size, analysis, files)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, claim_number, analysis, files):
+        size = len(analysis) + sum(f['size'] for f in files)
+        with self._lock:
+            self._drop(claim_number)
+            self._entries[claim_number] = (time.monotonic() + self.ttl, size, analysis, files)
+            self._size += size
+            # Least recently used claims go first, but the newest one is always kept
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+
+    def analyses(self, claim_numbers):
+        """claim number -> (analysis, file metadata) for the claims still cached"""
+        found = {}
+        with self._lock:
+            for claim_number in claim_numbers:
+                entry = self._get(claim_number)
+                if entry is not None:
+                    found[claim_number] = (entry[2], _file_metadata(entry[3]))
+        return found
+
+    def file(self, claim_number, idx):
+        """(metadata, bytes) of one proof file, or None"""
+        with self._lock:
+            entry = self._get(claim_number)
+        if entry is None or idx >= len(entry[3]):
+            return None
+        file_info = entry[3][idx]
+        return _file_metadata([file_info])[0], file_info['data']
+
+    def _get(self, claim_number):
+        entry = self._entries.get(claim_number)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(claim_number)
+            return None
+        self._entries.move_to_end(claim_number)
+        return entry
+
+    def _drop(self, claim_number):
+        entry = self._entries.pop(claim_number, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+
+class RedisClaimStore:
+    """Same interface as MemoryClaimStore, kept in Redis with a TTL (eviction follows Redis maxmemory-policy)"""
+
+    def __init__(self, redis_url, ttl):
+        self.ttl = ttl
+        self.client = redis.Redis(
+            connection_pool=redis.ConnectionPool.from_url(redis_url, max_connections=20)
+        )
+
+    def put(self, claim_number, analysis, files):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.setex(f'gem:{claim_number}', self.ttl, analysis.encode())
+        pipe.setex(f'filemeta:{claim_number}', self.ttl, orjson.dumps(_file_metadata(files)))
+        for idx, file_info in enumerate(files):
+            # Raw bytes, no base64
+            pipe.setex(f'file:{claim_number}:{idx}', self.ttl, file_info['data'])
+        pipe.execute()
+
+    def analyses(self, claim_numbers):
+        claim_numbers = list(claim_numbers)
+        if not claim_numbers:
+            return {}
+        values = self.client.mget(
+            [f'gem:{n}' for n in claim_numbers] + [f'filemeta:{n}' for n in claim_numbers]
+        )
+        count = len(claim_numbers)
+        return {
+            claim_number: (analysis.decode(), orjson.loads(meta) if meta else [])
+            for claim_number, analysis, meta in zip(claim_numbers, values[:count], values[count:])
+            if analysis is not None
+        }
+
+    def file(self, claim_number, idx):
+        meta, data = self.client.mget([f'filemeta:{claim_number}', f'file:{claim_number}:{idx}'])
+        if meta is None or data is None:
+            return None
+        files = orjson.loads(meta)
+        if idx >= len(files):
+            return None
+        return files[idx], data
@@ -1,8 +1,72 @@
 import numpy as np
+import orjson
 from datetime import datetime
 import random
 import pickle
+import logging
+import sqlite3
 import os
+from contextlib import closing
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit  # Optional: JIT-compiles the feature extraction kernel
+except ImportError:
+    njit = None
+
+# Processed claim ids are appended to SQLite, so a save only writes the claims added since the last one
+FL_STATE_DB = 'fl_state.db'
+LEGACY_STATE_FILE = 'fl_state.pkl'
+# One JSON line per training round, only ever appended to
+FL_HISTORY_LOG = 'fl_history.jsonl'
+HISTORY_IN_MEMORY = 10
+
+CLAIM_TYPE_ENCODING = {
+    'Outpatient': 0.25,
+    'Inpatient': 0.5,
+    'Emergency': 0.75,
+    'Surgery': 1.0
+}
+
+def _claim_features(amounts, fraud_scores, ml_confidences, type_codes, desc_lengths):
+    """Feature matrix with one row per claim, built from columnar claim fields"""
+    n = amounts.shape[0]
+    features = np.empty((n, 5), dtype=np.float32)
+    for i in range(n):
+        features[i, 0] = min(amounts[i] / 500000.0, 1.0)    # Normalized claim amount (max 500k)
+        features[i, 1] = fraud_scores[i]                    # Fraud score
+        features[i, 2] = ml_confidences[i] / 100.0          # ML confidence
+        features[i, 3] = type_codes[i]                      # Claim type encoding
+        features[i, 4] = min(desc_lengths[i] / 500.0, 1.0)  # Description length (normalized)
+    return features
+
+def _claim_features_numpy(amounts, fraud_scores, ml_confidences, type_codes, desc_lengths):
+    """Same feature matrix as _claim_features, as whole-column NumPy operations"""
+    return np.column_stack((
+        np.minimum(amounts / 500000.0, 1.0),
+        fraud_scores,
+        ml_confidences / 100.0,
+        type_codes,
+        np.minimum(desc_lengths / 500.0, 1.0)
+    )).astype(np.float32)
+
+def _weighted_mean(values, weights):
+    """Weighted average of values, e.g. node accuracies weighted by training samples"""
+    total = 0.0
+    total_weight = 0.0
+    for i in range(values.shape[0]):
+        total += values[i] * weights[i]
+        total_weight += weights[i]
+    return total / total_weight
+
+if njit is not None:
+    _claim_features = njit(cache=True, fastmath=True)(_claim_features)
+    _weighted_mean = njit(cache=True)(_weighted_mean)
+else:
+    # Without numba the per-row loop would run in the interpreter
+    _claim_features = _claim_features_numpy
 
 class FederatedNode:
     """Simulates a federated learning node (e.g., hospital, insurer)"""
@@ -28,20 +92,36 @@ class FederatedNode:
             return True
         return False
     
-    def train_local_model(self):
-        """Simulate local model training"""
+    def add_training_samples(self, claim_ids, features, labels):
+        """Add a batch of training samples; returns the claim ids that were new to this node"""
+        added = []
+        for claim_id, claim_features, label in zip(claim_ids, features, labels):
+            if claim_id not in self.processed_claims:
+                self.local_data.append({
+                    'claim_id': claim_id,
+                    'features': claim_features,
+                    'label': label
+                })
+                self.processed_claims.add(claim_id)
+                added.append(claim_id)
+        self.training_samples = len(self.local_data)
+        return added
+    
+    def train_local_model(self, noise=None):
+        """Simulate local model training; noise is drawn here unless the round supplies it"""
         if self.training_samples > 0:
             # Simulate training with random accuracy improvement
             base_accuracy = 0.75
             improvement = min(0.2, self.training_samples * 0.01)
-            noise = random.uniform(-0.03, 0.03)
-            self.local_model_accuracy = min(0.98, base_accuracy + improvement + noise)
+            if noise is None:
+                noise = random.uniform(-0.03, 0.03)
+            self.local_model_accuracy = min(0.98, base_accuracy + improvement + float(noise))
         return self.local_model_accuracy
 
 class FederatedLearningSystem:
     """Federated learning system that trains on approved/rejected blockchain claims"""
     
-    def __init__(self):
+    def __init__(self, seed=None):
         self.nodes = [
             FederatedNode(1, "Hospital Network A"),
             FederatedNode(2, "Hospital Network B"),
@@ -53,71 +133,103 @@ class FederatedLearningSystem:
         self.training_rounds = 0
         self.training_history = []
         self.processed_claims = set()  # Global tracker of processed claims
+        self._unsaved_claims = set()  # Processed since the last save
         self.last_trained_claim_count = 0
+        self.rng = np.random.default_rng(seed)  # Seed for reproducible training rounds
         
         # Load previous state if exists
         self._load_state()
+        self._load_history()
+    
+    def _connect_state_db(self):
+        conn = sqlite3.connect(FL_STATE_DB)
+        conn.execute('CREATE TABLE IF NOT EXISTS processed (claim_id INTEGER PRIMARY KEY)')
+        conn.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value)')
+        return conn
     
     def _save_state(self):
         """Save FL system state"""
         try:
-            state = {
-                'processed_claims': self.processed_claims,
-                'training_rounds': self.training_rounds,
-                'global_model_accuracy': self.global_model_accuracy,
-                'last_trained_claim_count': self.last_trained_claim_count
-            }
-            with open('fl_state.pkl', 'wb') as f:
-                pickle.dump(state, f)
+            with closing(self._connect_state_db()) as conn, conn:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO processed (claim_id) VALUES (?)',
+                    ((claim_id,) for claim_id in self._unsaved_claims)
+                )
+                conn.executemany('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)', [
+                    ('training_rounds', self.training_rounds),
+                    ('global_model_accuracy', self.global_model_accuracy),
+                    ('last_trained_claim_count', self.last_trained_claim_count)
+                ])
+            self._unsaved_claims.clear()
         except Exception as e:
             print(f"⚠️ Error saving FL state: {e}")
     
     def _load_state(self):
         """Load previous FL system state"""
         try:
-            if os.path.exists('fl_state.pkl'):
-                with open('fl_state.pkl', 'rb') as f:
+            if os.path.exists(FL_STATE_DB):
+                with closing(self._connect_state_db()) as conn:
+                    self.processed_claims = {row[0] for row in conn.execute('SELECT claim_id FROM processed')}
+                    state = dict(conn.execute('SELECT key, value FROM state'))
+            elif os.path.exists(LEGACY_STATE_FILE):
+                # One-time migration from the pickle format
+                with open(LEGACY_STATE_FILE, 'rb') as f:
                     state = pickle.load(f)
-                    self.processed_claims = state.get('processed_claims', set())
-                    self.training_rounds = state.get('training_rounds', 0)
-                    self.global_model_accuracy = state.get('global_model_accuracy', 0.75)
-                    self.last_trained_claim_count = state.get('last_trained_claim_count', 0)
-                print(f"✅ Loaded FL state: {len(self.processed_claims)} claims processed, {self.training_rounds} rounds")
+                self.processed_claims = set(state.get('processed_claims', set()))
+                self._unsaved_claims = set(self.processed_claims)
+            else:
+                return
+            
+            self.training_rounds = state.get('training_rounds', 0)
+            self.global_model_accuracy = state.get('global_model_accuracy', 0.75)
+            self.last_trained_claim_count = state.get('last_trained_claim_count', 0)
+            if self._unsaved_claims:
+                self._save_state()
+            print(f"✅ Loaded FL state: {len(self.processed_claims)} claims processed, {self.training_rounds} rounds")
         except Exception as e:
             print(f"⚠️ Error loading FL state: {e}")
     
+    def _append_history(self, round_result):
+        """Append one round to the history log"""
+        try:
+            with open(FL_HISTORY_LOG, 'ab') as f:
+                f.write(orjson.dumps(round_result) + b'\n')
+        except Exception as e:
+            print(f"⚠️ Error saving FL history: {e}")
+    
+    def _load_history(self):
+        """Most recent rounds from the history log"""
+        try:
+            if os.path.exists(FL_HISTORY_LOG):
+                with open(FL_HISTORY_LOG, 'rb') as f:
+                    recent = deque(f, maxlen=HISTORY_IN_MEMORY)
+                self.training_history = [orjson.loads(line) for line in recent if line.strip()]
+        except Exception as e:
+            print(f"⚠️ Error loading FL history: {e}")
+    
     def _extract_features(self, claim):
         """Extract numerical features from claim data"""
-        features = []
-        
-        # Feature 1: Normalized claim amount (0-1 scale, assuming max 500k)
-        amount = float(claim.get('amount', 0))
-        features.append(min(amount / 500000, 1.0))
-        
-        # Feature 2: Fraud score
-        fraud_score = float(claim.get('fraudScore', 0))
-        features.append(fraud_score)
-        
-        # Feature 3: ML confidence
-        ml_confidence = float(claim.get('mlConfidence', 0)) / 100.0
-        features.append(ml_confidence)
-        
-        # Feature 4: Claim type encoding
-        claim_type = claim.get('claimType', 'Outpatient')
-        claim_type_encoding = {
-            'Outpatient': 0.25,
-            'Inpatient': 0.5,
-            'Emergency': 0.75,
-            'Surgery': 1.0
-        }
-        features.append(claim_type_encoding.get(claim_type, 0.25))
-        
-        # Feature 5: Description length (normalized)
-        description = claim.get('description', '')
-        desc_length = min(len(description) / 500, 1.0)
-        features.append(desc_length)
+        return self._extract_features_batch([claim])[0]
+    
+    def _extract_features_batch(self, claims):
+        """Extract features for many claims at once - a (K, 5) float32 array, one row per claim"""
+        n = len(claims)
+        amounts = np.fromiter((float(c.get('amount', 0)) for c in claims), dtype=np.float64, count=n)
+        fraud_scores = np.fromiter((float(c.get('fraudScore', 0)) for c in claims), dtype=np.float64, count=n)
+        ml_confidences = np.fromiter((float(c.get('mlConfidence', 0)) for c in claims), dtype=np.float64, count=n)
+        type_codes = np.fromiter(
+            (CLAIM_TYPE_ENCODING.get(c.get('claimType', 'Outpatient'), 0.25) for c in claims),
+            dtype=np.float64, count=n
+        )
+        desc_lengths = np.fromiter((len(c.get('description', '')) for c in claims), dtype=np.float64, count=n)
         
-        return np.array(features)
+        return _claim_features(amounts, fraud_scores, ml_confidences, type_codes, desc_lengths)
+    
+    def _node_indices(self, claim_ids):
+        """Node index for each claim id via a Knuth multiplicative hash, so a claim always lands on the same node"""
+        ids = np.asarray(claim_ids, dtype=np.uint64)
+        hashed = (ids * np.uint64(2654435761)) & np.uint64(0xffffffff)
+        return hashed % np.uint64(len(self.nodes))
     
     def load_new_claims_from_blockchain(self, claims):
         """
@@ -131,40 +243,53 @@ class FederatedLearningSystem:
         """
         new_claims_count = 0
         
-        for claim in claims:
-            claim_id = claim.get('id')
-            status = claim.get('status')
-            
-            # Only train on finalized claims (APPROVED or REJECTED)
-            if status not in ['APPROVED', 'REJECTED']:
+        # Only train on finalized claims (APPROVED or REJECTED) not processed before
+        pending = [
+            claim for claim in claims
+            if claim.get('status') in ['APPROVED', 'REJECTED']
+            and claim.get('id') not in self.processed_claims
+        ]
+        
+        # Extract features for all new claims in one pass
+        try:
+            feature_rows = self._extract_features_batch(pending)
+        except Exception as e:
+            print(f"   ⚠️ Error extracting claim features: {e}")
+            return 0
+        
+        claim_ids = [claim.get('id') for claim in pending]
+        # Label: 1 if rejected (fraudulent), 0 if approved (legitimate)
+        labels = [1 if claim.get('status') == 'REJECTED' else 0 for claim in pending]
+        
+        # Distribute across nodes by claim id (simulating federated distribution)
+        node_of = self._node_indices(claim_ids)
+        log_claims = logger.isEnabledFor(logging.DEBUG)
+        nodes_used = 0
+        for node_idx, node in enumerate(self.nodes):
+            selected = np.flatnonzero(node_of == node_idx)
+            if selected.size == 0:
                 continue
             
-            # Skip if already processed
-            if claim_id in self.processed_claims:
-                continue
+            added = node.add_training_samples(
+                [claim_ids[i] for i in selected], feature_rows[selected], [labels[i] for i in selected]
+            )
+            added = set(added)
+            self.processed_claims.update(added)
+            self._unsaved_claims.update(added)
+            new_claims_count += len(added)
+            nodes_used += bool(added)
             
-            # Extract features
-            try:
-                features = self._extract_features(claim)
-                
-                # Label: 1 if rejected (fraudulent), 0 if approved (legitimate)
-                label = 1 if status == 'REJECTED' else 0
-                
-                # Distribute to a random node (simulating federated distribution)
-                node = random.choice(self.nodes)
-                if node.add_training_sample(claim_id, features, label):
-                    self.processed_claims.add(claim_id)
-                    new_claims_count += 1
-                    
-                    print(f"   📊 Claim {claim_id} added to {node.name} - Label: {'Fraudulent' if label == 1 else 'Legitimate'}")
-                    
-            except Exception as e:
-                print(f"   ⚠️ Error processing claim {claim_id}: {e}")
-                continue
+            if log_claims:
+                for i in selected:
+                    if claim_ids[i] in added:
+                        logger.debug(
+                            "📊 Claim %s added to %s - Label: %s",
+                            claim_ids[i], node.name, 'Fraudulent' if labels[i] == 1 else 'Legitimate'
+                        )
         
         if new_claims_count > 0:
             self._save_state()
-            print(f"\n✅ Loaded {new_claims_count} new claims for federated training")
+            logger.info("✅ Loaded %d new claims across %d nodes for federated training", new_claims_count, nodes_used)
         
         return new_claims_count
     
@@ -221,10 +346,13 @@ class FederatedLearningSystem:
         node_weights = []
         participating_nodes = []
         
-        for node in self.nodes:
+        # One draw of training noise for every node this round
+        noise = self.rng.uniform(-0.03, 0.03, size=len(self.nodes))
+        
+        for node, node_noise in zip(self.nodes, noise):
             if node.training_samples > 0:
                 print(f"   🔄 {node.name} training on {node.training_samples} samples...")
-                accuracy = node.train_local_model()
+                accuracy = node.train_local_model(node_noise)
                 node_accuracies.append(accuracy)
                 node_weights.append(node.training_samples)
                 participating_nodes.append({
@@ -237,10 +365,10 @@ class FederatedLearningSystem:
         
         # Aggregate models (weighted average based on training samples)
         if node_accuracies:
-            total_weight = sum(node_weights)
-            self.global_model_accuracy = sum(
-                acc * weight for acc, weight in zip(node_accuracies, node_weights)
-            ) / total_weight
+            self.global_model_accuracy = float(_weighted_mean(
+                np.array(node_accuracies, dtype=np.float64),
+                np.array(node_weights, dtype=np.int64)
+            ))
             
             print(f"\n   ✅ Global model accuracy: {self.global_model_accuracy:.2%}")
         
@@ -258,6 +386,8 @@ class FederatedLearningSystem:
         }
         
         self.training_history.append(round_result)
+        del self.training_history[:-HISTORY_IN_MEMORY]
+        self._append_history(round_result)
         self._save_state()
         
         return round_result
@@ -292,6 +422,7 @@ class FederatedLearningSystem:
     def reset(self):
         """Reset the FL system (for testing purposes)"""
         self.processed_claims = set()
+        self._unsaved_claims = set()
         self.training_rounds = 0
         self.global_model_accuracy = 0.75
         self.last_trained_claim_count = 0
@@ -303,5 +434,12 @@ class FederatedLearningSystem:
             node.training_samples = 0
             node.local_model_accuracy = 0.0
         
+        try:
+            with closing(self._connect_state_db()) as conn, conn:
+                conn.execute('DELETE FROM processed')
+        except Exception as e:
+            print(f"⚠️ Error clearing FL state: {e}")
+        if os.path.exists(FL_HISTORY_LOG):
+            os.remove(FL_HISTORY_LOG)
         self._save_state()
         print("✅ Federated Learning system reset")
\ No newline at end of file
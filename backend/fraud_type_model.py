@@ -6,11 +6,101 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
 import joblib
 import os
+import threading
 from datetime import datetime
 
+try:
+    # Optional: run the forest through ONNX Runtime's compiled tree ensemble kernel
+    import onnxruntime as ort
+    from skl2onnx import to_onnx
+except ImportError:
+    ort = None
+
+try:
+    from numba import njit  # Optional: JIT-compiles the packed forest traversal
+except ImportError:
+    njit = None
+
+MODEL_PATH = 'fraud_type_model.pkl'
+ONNX_MODEL_PATH = 'fraud_type_model.onnx'
+
+def _pack_forest(model):
+    """
+    Flatten all trees of a fitted forest into one compact struct-of-arrays
+    
+    Thresholds are stored as uint16 ranks into the sorted split values of their
+    feature, and inputs are mapped to the same ranks, so x <= threshold holds
+    exactly when rank(x) <= rank(threshold) - the packed forest predicts exactly
+    like sklearn while each node is an int8 feature, a uint16 threshold and two
+    int32 children.
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    n_features = model.n_features_in_
+    split_values = [
+        np.unique(np.concatenate([tree.threshold[tree.feature == f] for tree in trees]))
+        for f in range(n_features)
+    ]
+    if max(len(values) for values in split_values) > np.iinfo(np.uint16).max or n_features > 127:
+        return None
+    
+    roots, features, thresholds, lefts, rights, values = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        is_split = tree.children_left >= 0
+        feature = np.where(is_split, tree.feature, -1)
+        threshold = np.zeros(tree.node_count, dtype=np.uint16)
+        for f in range(n_features):
+            at_f = is_split & (feature == f)
+            threshold[at_f] = np.searchsorted(split_values[f], tree.threshold[at_f])
+        value = tree.value[:, 0, :]
+        
+        roots.append(offset)
+        features.append(feature.astype(np.int8))
+        thresholds.append(threshold)
+        lefts.append(np.where(is_split, tree.children_left + offset, -1).astype(np.int32))
+        rights.append(np.where(is_split, tree.children_right + offset, -1).astype(np.int32))
+        values.append((value / value.sum(axis=1, keepdims=True)).astype(np.float32))
+        offset += tree.node_count
+    
+    return {
+        'split_values': split_values,
+        'roots': np.array(roots, dtype=np.int32),
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values)
+    }
+
+
+def _forest_proba(codes, roots, feature, threshold, left, right, value):
+    """Average leaf class distribution over all packed trees for each row of rank codes"""
+    n = codes.shape[0]
+    n_trees = roots.shape[0]
+    out = np.zeros((n, value.shape[1]))
+    for i in range(n):
+        for r in range(n_trees):
+            node = roots[r]
+            while feature[node] >= 0:
+                if codes[i, feature[node]] <= threshold[node]:
+                    node = left[node]
+                else:
+                    node = right[node]
+            out[i, :] += value[node, :]
+        out[i, :] /= n_trees
+    return out
+
+
+if njit is not None:
+    _forest_proba = njit(cache=True)(_forest_proba)
+
+
 class FraudTypePredictor:
     """ML model for predicting fraud type based on claim details"""
     
+    # Encoded feature column -> key in the prediction input dict
+    CATEGORICAL_INPUTS = (('Gender', 'gender'), ('Diagnosis', 'diagnosis'), ('Treatment', 'treatment'))
+    
     def __init__(self, dataset_path='dataset.csv'):
         self.dataset_path = dataset_path
         self.model = None
@@ -18,11 +108,16 @@ class FraudTypePredictor:
         self.fraud_type_encoder = None
         # Updated to match your exact column names
         self.feature_columns = ['Age', 'Gender', 'Diagnosis', 'Treatment', 'Amount Billed']
+        self._category_codes = {}
+        self._class_names = []
+        self._onnx_session = None
+        self._packed_forest = None
+        self._row_buffers = threading.local()  # One reusable 1-row feature buffer per thread
         self.is_trained = False
         self.model_accuracy = 0.0
         
         # Try to load existing model
-        if os.path.exists('fraud_type_model.pkl'):
+        if os.path.exists(MODEL_PATH):
             self.load_model()
         else:
             print("⚠️ No pre-trained model found. Training new model...")
@@ -126,6 +221,7 @@ class FraudTypePredictor:
             
             # Save model
             self.save_model()
+            self._prepare_inference()
             self.is_trained = True
             
             return True
@@ -155,54 +251,128 @@ class FraudTypePredictor:
             }
         
         try:
-            # Create DataFrame from input (map to your column names)
-            input_df = pd.DataFrame([{
-                'Age': patient_data.get('age', 0),
-                'Gender': patient_data.get('gender', 'Unknown'),
-                'Diagnosis': patient_data.get('diagnosis', 'Unknown'),
-                'Treatment': patient_data.get('treatment', 'Unknown'),
-                'Amount Billed': patient_data.get('amount_billed', 0)
-            }])
-            
-            # Encode categorical features
-            for col in ['Gender', 'Diagnosis', 'Treatment']:
-                if col in self.label_encoders:
-                    le = self.label_encoders[col]
-                    try:
-                        input_df[col] = le.transform(input_df[col].astype(str))
-                    except:
-                        # Handle unseen values
-                        input_df[col] = -1
-            
-            # Predict
-            prediction = self.model.predict(input_df)[0]
-            probabilities = self.model.predict_proba(input_df)[0]
-            
-            # Decode prediction
-            fraud_type = self.fraud_type_encoder.inverse_transform([prediction])[0]
-            confidence = probabilities[prediction]
-            
-            # Get all probabilities
-            prob_dict = {
-                self.fraud_type_encoder.inverse_transform([i])[0]: float(prob)
-                for i, prob in enumerate(probabilities)
-            }
+            buf = getattr(self._row_buffers, 'buf', None)
+            if buf is None:
+                buf = self._row_buffers.buf = np.empty((1, len(self.feature_columns)), dtype=np.float32)
+            self._encode_record(patient_data, buf[0])
+            return self._predict_encoded(buf)[0]
             
+        except Exception as e:
+            print(f"❌ Prediction error: {e}")
             return {
-                'fraud_type': fraud_type,
-                'confidence': float(confidence),
-                'probabilities': prob_dict,
-                'model_accuracy': self.model_accuracy
+                'fraud_type': 'ERROR',
+                'confidence': 0.0,
+                'probabilities': {},
+                'error': str(e)
             }
+    
+    def predict_fraud_type_batch(self, records):
+        """
+        Predict fraud types for many claims with one predict_proba call
+        
+        Args:
+            records: list of dicts with the same keys as predict_fraud_type
+        
+        Returns:
+            list of result dicts, in input order
+        """
+        if not self.is_trained or self.model is None:
+            return [{
+                'fraud_type': 'UNKNOWN',
+                'confidence': 0.0,
+                'probabilities': {},
+                'error': 'Model not trained'
+            } for _ in records]
+        
+        try:
+            return self._predict_encoded(self._encode_records(records))
             
         except Exception as e:
             print(f"❌ Prediction error: {e}")
-            return {
+            return [{
                 'fraud_type': 'ERROR',
                 'confidence': 0.0,
                 'probabilities': {},
                 'error': str(e)
-            }
+            } for _ in records]
+    
+    def _predict_encoded(self, X):
+        """Result dicts for an encoded feature matrix"""
+        if self._onnx_session is not None:
+            probabilities = self._onnx_session.run(
+                ['probabilities'], {self._onnx_session.get_inputs()[0].name: X}
+            )[0]
+        elif self._packed_forest is not None:
+            probabilities = self._packed_proba(X)
+        else:
+            probabilities = self.model.predict_proba(X)
+        predictions = probabilities.argmax(axis=1)
+        
+        return [{
+            'fraud_type': self._class_names[prediction],
+            'confidence': float(row[prediction]),
+            'probabilities': dict(zip(self._class_names, row.tolist())),
+            'model_accuracy': self.model_accuracy
+        } for row, prediction in zip(probabilities, predictions)]
+    
+    def _encode_records(self, records):
+        """Feature matrix in feature_columns order"""
+        X = np.empty((len(records), len(self.feature_columns)), dtype=np.float32)
+        for i, record in enumerate(records):
+            self._encode_record(record, X[i])
+        return X
+    
+    def _encode_record(self, record, row):
+        """Fill one feature row in place; unseen categories encode as -1"""
+        row[0] = record.get('age', 0)
+        row[4] = record.get('amount_billed', 0)
+        for col_idx, (col, key) in enumerate(self.CATEGORICAL_INPUTS, 1):
+            lookup = self._category_codes.get(col)
+            row[col_idx] = lookup.get(str(record.get(key, 'Unknown')), -1) if lookup is not None else -1
+    
+    def _prepare_inference(self):
+        """Precompute label lookup tables so prediction needs no LabelEncoder.transform calls"""
+        self._category_codes = {
+            col: {cls: code for code, cls in enumerate(le.classes_)}
+            for col, le in self.label_encoders.items()
+        }
+        # Probability columns follow model.classes_ (encoded fraud types)
+        self._class_names = [str(name) for name in self.fraud_type_encoder.classes_[self.model.classes_]]
+        # Inference passes plain arrays, so drop the column names recorded by fit on a DataFrame
+        if hasattr(self.model, 'feature_names_in_'):
+            del self.model.feature_names_in_
+        self._onnx_session = self._load_onnx_session()
+        # Compiled traversal of the packed forest, when ONNX Runtime is not available
+        self._packed_forest = _pack_forest(self.model) if self._onnx_session is None and njit is not None else None
+    
+    def _packed_proba(self, X):
+        """predict_proba over the packed forest; inputs are first mapped to threshold ranks"""
+        packed = self._packed_forest
+        codes = np.empty(X.shape, dtype=np.uint16)
+        for f, values in enumerate(packed['split_values']):
+            codes[:, f] = np.searchsorted(values, X[:, f], side='left')
+        return _forest_proba(
+            codes, packed['roots'], packed['feature'], packed['threshold'],
+            packed['left'], packed['right'], packed['value']
+        )
+    
+    def _load_onnx_session(self):
+        """ONNX Runtime session for the forest, converted once per saved model; None to use sklearn"""
+        if ort is None:
+            return None
+        try:
+            if (not os.path.exists(ONNX_MODEL_PATH)
+                    or os.path.getmtime(ONNX_MODEL_PATH) < os.path.getmtime(MODEL_PATH)):
+                sample = np.zeros((1, len(self.feature_columns)), dtype=np.float32)
+                onnx_model = to_onnx(self.model, sample, options={'zipmap': False})
+                with open(ONNX_MODEL_PATH, 'wb') as f:
+                    f.write(onnx_model.SerializeToString())
+            session = ort.InferenceSession(ONNX_MODEL_PATH, providers=['CPUExecutionProvider'])
+            print("✅ Fraud type model running on ONNX Runtime")
+            return session
+        except Exception as e:
+            print(f"⚠️ ONNX conversion failed, using sklearn for inference: {e}")
+            return None
     
     def save_model(self):
         """Save trained model and encoders"""
@@ -215,7 +385,7 @@ class FraudTypePredictor:
                 'model_accuracy': self.model_accuracy,
                 'trained_at': datetime.now().isoformat()
             }
-            joblib.dump(model_data, 'fraud_type_model.pkl')
+            joblib.dump(model_data, MODEL_PATH)
             print(f"✅ Model saved to fraud_type_model.pkl")
         except Exception as e:
             print(f"❌ Error saving model: {e}")
@@ -223,12 +393,13 @@ class FraudTypePredictor:
     def load_model(self):
         """Load pre-trained model and encoders"""
         try:
-            model_data = joblib.load('fraud_type_model.pkl')
+            model_data = joblib.load(MODEL_PATH)
             self.model = model_data['model']
             self.label_encoders = model_data['label_encoders']
             self.fraud_type_encoder = model_data['fraud_type_encoder']
             self.feature_columns = model_data['feature_columns']
             self.model_accuracy = model_data.get('model_accuracy', 0.0)
+            self._prepare_inference()
             self.is_trained = True
             print(f"✅ Model loaded successfully (Accuracy: {self.model_accuracy:.2%})")
             print(f"   Fraud types: {list(self.fraud_type_encoder.classes_)}")
@@ -0,0 +1,12 @@
+import os
+
+# Requests spend most of their time waiting on the blockchain node and Gemini,
+# so cooperative gevent workers give high concurrency without extra processes
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5000')
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = 60
+
+# Prepared claims (Gemini analysis, proof files) live in process memory unless
+# REDIS_URL is set, so keep a single worker without Redis
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
@@ -1,7 +1,125 @@
+import base64
+import binascii
 import hashlib
+import hmac
 import json
+import orjson
 from datetime import datetime
-import secrets
+from typing import NamedTuple
+import itertools
+import os
+import time
+
+# hashlib's sha256 is OpenSSL's EVP digest, which already dispatches to the
+# SHA-NI block function on CPUs that have it; bind it once for the hot paths
+_sha256 = hashlib.sha256
+
+
+def _sha256_hex(data):
+    """Hex SHA-256 digest of bytes"""
+    return _sha256(data).hexdigest()
+
+
+def _encode_digest(digest):
+    """Raw digest -> base64 text for the JSON boundary"""
+    return base64.b64encode(digest).decode()
+
+
+def _decode_digest(value):
+    """base64 (or legacy hex) digest text -> raw bytes, None when malformed"""
+    try:
+        if len(value) == 64:
+            return bytes.fromhex(value)
+        return base64.b64decode(value, validate=True)
+    except (TypeError, ValueError, binascii.Error):
+        return None
+
+# Simulated private keys are derived from one OS seed and a counter instead of
+# a urandom call per key; the seed is replaced every KEY_RESEED_INTERVAL keys
+# and in each forked worker so no two processes share a key stream
+KEY_RESEED_INTERVAL = 1 << 16
+_key_state = None
+
+
+def _reseed_keys():
+    global _key_state
+    _key_state = (os.urandom(32), itertools.count())
+
+
+_reseed_keys()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reseed_keys)
+
+
+def _next_private_key():
+    """64 hex characters of key material"""
+    seed, counter = _key_state
+    index = next(counter)
+    if index >= KEY_RESEED_INTERVAL:
+        _reseed_keys()
+        seed, counter = _key_state
+        index = next(counter)
+    return _sha256_hex(seed + index.to_bytes(8, 'little'))
+
+
+_REQUIRED_CREDENTIAL_FIELDS = frozenset(('@context', 'type', 'issuer', 'credentialSubject', 'proof'))
+
+
+def _iso_from_ns(timestamp_ns):
+    """Local ISO timestamp, as datetime.now().isoformat() would give"""
+    seconds, nanos = divmod(timestamp_ns, 1_000_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=nanos // 1000).isoformat()
+
+
+def _did_from_bytes(identifier):
+    """Create unique DID based on user info"""
+    return f"did:insure:user:{_sha256_hex(identifier)[:16]}"
+
+
+def _unique_id(email, id_number, timestamp_ns):
+    """DID seed bytes: user details plus the issuance time in nanoseconds"""
+    return f"{email}{id_number}".encode() + timestamp_ns.to_bytes(8, 'little')
+
+
+def _merkle_node(left, right):
+    """Internal Merkle node; the 0x01 prefix keeps nodes distinct from subject hashes"""
+    return _sha256(b'\x01' + left + right).digest()
+
+
+def _merkle_levels(leaves):
+    """All tree levels from the leaves up to the root; an odd last node moves up unchanged"""
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_merkle_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def _merkle_path(levels, index):
+    """[side, sibling hash] pairs from leaf index up to the root"""
+    path = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append(['left' if sibling < index else 'right', _encode_digest(level[sibling])])
+        index //= 2
+    return path
+
+
+class Identity(NamedTuple):
+    """SSI identity returned by create_identity; _asdict() gives the JSON form"""
+    did: str
+    name: str
+    email: str
+    verifiable_credential: dict
+    public_key: str
+    status: str
+    created_at: str
+    timestamp: str
+
 
 class SSISystem:
     """Self-Sovereign Identity system for decentralized identity management"""
@@ -9,26 +127,86 @@ class SSISystem:
     def __init__(self):
         self.issuer_did = "did:insure:issuer:abc123"
         self.credential_type = "InsuranceIdentityCredential"
+        self._verification_method = f"{self.issuer_did}#keys-1"
+        # Fields shared by every issued credential
+        self._credential_template = {
+            '@context': ('https://www.w3.org/2018/credentials/v1',),
+            'type': ('VerifiableCredential', self.credential_type),
+            'issuer': self.issuer_did
+        }
     
     def generate_did(self, identifier):
-        """Generate a decentralized identifier (DID)"""
-        # Create unique DID based on user info
-        did_hash = hashlib.sha256(identifier.encode()).hexdigest()[:16]
-        return f"did:insure:user:{did_hash}"
+        """Generate a decentralized identifier (DID) from a str or bytes identifier"""
+        if isinstance(identifier, str):
+            identifier = identifier.encode()
+        return _did_from_bytes(identifier)
+    
+    def generate_dids_batch(self, identifiers):
+        """DIDs for many bytes identifiers, in input order"""
+        sha256 = _sha256
+        return [f"did:insure:user:{sha256(identifier).hexdigest()[:16]}" for identifier in identifiers]
     
     def create_identity(self, name, email, id_number, date_of_birth):
         """Create a new SSI identity with verifiable credentials"""
+        # One clock read for every timestamp of this identity
+        timestamp_ns = time.time_ns()
+        now_iso = _iso_from_ns(timestamp_ns)
         
         # Generate DID
-        unique_id = f"{email}{id_number}{datetime.now().timestamp()}"
-        did = self.generate_did(unique_id)
+        did = _did_from_bytes(_unique_id(email, id_number, timestamp_ns))
+        credential = self._build_credential(did, name, email, id_number, date_of_birth, now_iso)
+        
+        # Generate cryptographic proof
+        proof = self._generate_proof(credential, now_iso)
+        credential['proof'] = proof
+        
+        return self._build_identity(did, name, email, credential, now_iso)
+    
+    def create_identities_batch(self, subjects):
+        """
+        Create many SSI identities whose credentials share one proof over a Merkle root
+        
+        Each credential's proof carries the root as proofValue plus the sibling
+        hashes from its subject up to that root, so N credentials cost one proof
+        and N * log2(N) internal hashes.
         
+        Args:
+            subjects: list of dicts with keys: name, email, id_number, date_of_birth
+        
+        Returns:
+            list of identities, in input order
+        """
+        timestamp_ns = time.time_ns()
+        now_iso = _iso_from_ns(timestamp_ns)
+        dids = self.generate_dids_batch([_unique_id(s['email'], s['id_number'], timestamp_ns) for s in subjects])
+        built = [
+            (did, self._build_credential(did, s['name'], s['email'], s['id_number'], s['date_of_birth'], now_iso))
+            for did, s in zip(dids, subjects)
+        ]
+        if not built:
+            return []
+        
+        levels = _merkle_levels([self._subject_digest(credential) for _, credential in built])
+        root = _encode_digest(levels[-1][0])
+        
+        identities = []
+        for index, (did, credential) in enumerate(built):
+            credential['proof'] = {
+                **self._proof_fields(root, now_iso),
+                'merklePath': _merkle_path(levels, index)
+            }
+            identities.append(self._build_identity(
+                did, credential['credentialSubject']['name'], credential['credentialSubject']['email'], credential, now_iso
+            ))
+        
+        return identities
+    
+    def _build_credential(self, did, name, email, id_number, date_of_birth, now_iso):
+        """Unsigned verifiable credential for a DID"""
         # Create verifiable credential
         credential = {
-            '@context': ['https://www.w3.org/2018/credentials/v1'],
-            'type': ['VerifiableCredential', self.credential_type],
-            'issuer': self.issuer_did,
-            'issuanceDate': datetime.now().isoformat(),
+            **self._credential_template,
+            'issuanceDate': now_iso,
             'credentialSubject': {
                 'id': did,
                 'name': name,
@@ -38,32 +216,34 @@ class SSISystem:
             }
         }
         
-        # Generate cryptographic proof
-        proof = self._generate_proof(credential)
-        credential['proof'] = proof
-        
+        return credential
+    
+    def _build_identity(self, did, name, email, credential, now_iso):
+        """Identity record around a proven credential"""
         # Create public/private key pair (simulated)
-        key_pair = self._generate_key_pair()
-        
-        identity = {
-            'did': did,
-            'name': name,
-            'email': email,
-            'verifiable_credential': credential,
-            'public_key': key_pair['public_key'],
-            'status': 'ACTIVE',
-            'created_at': datetime.now().isoformat(),
-            'timestamp': datetime.now().isoformat()
-        }
+        public_key, _ = self._generate_key_pair()
         
-        return identity
+        return Identity(
+            did=did,
+            name=name,
+            email=email,
+            verifiable_credential=credential,
+            public_key=public_key,
+            status='ACTIVE',
+            created_at=now_iso,
+            timestamp=now_iso
+        )
+    
+    def verify_batch(self, credentials):
+        """Verify many credentials (e.g. an audit export), stamped with one verification time"""
+        verified_at = datetime.now().isoformat()
+        return [self.verify_credential(credential, verified_at) for credential in credentials]
     
-    def verify_credential(self, credential):
+    def verify_credential(self, credential, verified_at=None):
         """Verify a verifiable credential"""
         try:
             # Check if credential has required fields
-            required_fields = ['@context', 'type', 'issuer', 'credentialSubject', 'proof']
-            if not all(field in credential for field in required_fields):
+            if _REQUIRED_CREDENTIAL_FIELDS - credential.keys():
                 return {
                     'valid': False,
                     'error': 'Missing required fields'
@@ -76,7 +256,9 @@ class SSISystem:
                     'error': 'Invalid issuer'
                 }
             
-            # Verify proof
+            # Verify proof - deliberately uncached: a key that binds the subject
+            # costs the same serialization as a miss, and cached subjects would
+            # keep personal data in memory
             proof_valid = self._verify_proof(credential, credential['proof'])
             
             if not proof_valid:
@@ -88,7 +270,7 @@ class SSISystem:
             return {
                 'valid': True,
                 'did': credential['credentialSubject']['id'],
-                'verified_at': datetime.now().isoformat(),
+                'verified_at': verified_at or datetime.now().isoformat(),
                 'issuer': credential['issuer']
             }
         
@@ -98,38 +280,64 @@ class SSISystem:
                 'error': str(e)
             }
     
-    def _generate_proof(self, credential):
+    def _generate_proof(self, credential, now_iso):
         """Generate cryptographic proof for credential"""
         # Create a hash of the credential as proof
-        credential_string = json.dumps(credential.get('credentialSubject', {}), sort_keys=True)
-        signature = hashlib.sha256(credential_string.encode()).hexdigest()
+        signature = _encode_digest(self._subject_digest(credential))
         
+        return self._proof_fields(signature, now_iso)
+    
+    def _proof_fields(self, signature, created):
+        """Proof envelope around a signature value"""
         return {
             'type': 'Ed25519Signature2020',
-            'created': datetime.now().isoformat(),
+            'created': created,
             'proofPurpose': 'assertionMethod',
-            'verificationMethod': f"{self.issuer_did}#keys-1",
+            'verificationMethod': self._verification_method,
             'proofValue': signature
         }
     
+    def _subject_digest(self, credential):
+        """SHA-256 of the canonical credentialSubject JSON"""
+        return _sha256(orjson.dumps(credential.get('credentialSubject', {}), option=orjson.OPT_SORT_KEYS)).digest()
+    
+    def _legacy_subject_digest(self, credential):
+        """Digest in the stdlib json.dumps form that proofs issued before orjson were made over"""
+        credential_string = json.dumps(credential.get('credentialSubject', {}), sort_keys=True)
+        return _sha256(credential_string.encode()).digest()
+    
     def _verify_proof(self, credential, proof):
         """Verify the cryptographic proof"""
-        # Recreate the signature
-        credential_string = json.dumps(credential.get('credentialSubject', {}), sort_keys=True)
-        expected_signature = hashlib.sha256(credential_string.encode()).hexdigest()
+        # Recreate the signature from the subject itself - hashing canonical
+        # bytes carried alongside the proof would accept any edited subject
+        digest = self._subject_digest(credential)
+        signature = _decode_digest(proof.get('proofValue'))
+        if signature is None:
+            return False
         
-        # Compare with provided proof
-        return proof.get('proofValue') == expected_signature
+        # Batch-issued credentials prove membership under a shared Merkle root
+        if 'merklePath' in proof:
+            for side, sibling in proof['merklePath']:
+                sibling = _decode_digest(sibling)
+                if sibling is None:
+                    return False
+                digest = _merkle_node(sibling, digest) if side == 'left' else _merkle_node(digest, sibling)
+            return hmac.compare_digest(signature, digest)
+        
+        # Compare with provided proof; single proofs issued before the switch
+        # to orjson were made over the stdlib json form
+        return (
+            hmac.compare_digest(signature, digest)
+            or hmac.compare_digest(signature, self._legacy_subject_digest(credential))
+        )
     
     def _generate_key_pair(self):
-        """Generate a simulated public/private key pair"""
-        private_key = secrets.token_hex(32)
-        public_key = hashlib.sha256(private_key.encode()).hexdigest()
+        """Generate a simulated (public_key, private_key) pair"""
+        private_key = _next_private_key()
+        public_key = _encode_digest(_sha256(private_key.encode()).digest())
         
-        return {
-            'public_key': public_key,
-            'private_key': private_key  # In real system, this would be stored securely by user
-        }
+        # In real system, the private key would be stored securely by user
+        return public_key, private_key
     
     def revoke_credential(self, did):
         """Revoke a credential (for demonstration)"""
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_model import FraudDetectionModel, get_genai_client
+
+
+def embedding_response(dim):
+    return SimpleNamespace(embeddings=[SimpleNamespace(values=[1.0] * dim)])
+
+
+class AsyncPredictionTest(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.MagicMock()
+        self.client.models.embed_content.side_effect = AssertionError('sync embed_content called')
+        self.client.aio.models.embed_content = mock.AsyncMock(
+            return_value=embedding_response(FraudDetectionModel.EMBEDDING_DIM)
+        )
+        self.client.aio.models.generate_content = mock.AsyncMock(
+            return_value=SimpleNamespace(text='No fraud indicators found. LOW risk.')
+        )
+        self.model = FraudDetectionModel(genai_client=self.client, seed=0)
+        self.claim = {
+            'patientName': 'Test Patient',
+            'claimType': 'Surgery',
+            'diagnosis': 'Fracture',
+            'amount': 25000,
+            'description': 'Treatment for a fractured arm'
+        }
+
+    def test_async_prediction_awaits_aio_embedding(self):
+        result = asyncio.run(self.model.predict_fraud_with_gemini_async(self.claim))
+
+        self.client.models.embed_content.assert_not_called()
+        self.client.aio.models.embed_content.assert_awaited_once()
+        self.assertIn('fraud_probability', result)
+
+    def test_async_semantic_match_skips_generation(self):
+        asyncio.run(self.model.predict_fraud_with_gemini_async(self.claim))
+        # Same claim text for another patient matches the stored embedding
+        asyncio.run(self.model.predict_fraud_with_gemini_async({**self.claim, 'patientName': 'Other'}))
+
+        self.client.models.embed_content.assert_not_called()
+        self.assertEqual(self.client.aio.models.embed_content.await_count, 2)
+        self.client.aio.models.generate_content.assert_awaited_once()
+
+
+class SemanticCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.MagicMock()
+        self.client.models.embed_content.return_value = embedding_response(FraudDetectionModel.EMBEDDING_DIM)
+        self.client.models.generate_content.return_value = SimpleNamespace(
+            text='Patient Alice Example shows no fraud indicators. Fraud score: 20%. APPROVE - legitimate.'
+        )
+        self.model = FraudDetectionModel(genai_client=self.client, seed=0)
+        self.claim = {
+            'patientName': 'Alice Example',
+            'claimType': 'Surgery',
+            'diagnosis': 'Fracture',
+            'amount': 25000,
+            'description': 'Treatment for a fractured arm'
+        }
+
+    def test_semantic_match_does_not_return_other_patients_analysis(self):
+        first = self.model.predict_fraud_with_gemini(self.claim)
+        second = self.model.predict_fraud_with_gemini({**self.claim, 'patientName': 'Bob Other'})
+
+        self.client.models.generate_content.assert_called_once()
+        self.assertIn('Alice Example', first['gemini_analysis'])
+        self.assertNotIn('Alice Example', second['gemini_analysis'])
+        self.assertIn('Bob Other', second['gemini_analysis'])
+        self.assertEqual(first['fraud_probability'], second['fraud_probability'])
+
+    def test_semantic_score_follows_current_description(self):
+        first = self.model.predict_fraud_with_gemini(self.claim)
+        # Same signature bucket, but a longer description earns this claim its own adjustment
+        longer = {**self.claim, 'patientName': 'Bob Other', 'description': self.claim['description'] + ' ' + 'x' * 200}
+        second = self.model.predict_fraud_with_gemini(longer)
+
+        self.client.models.generate_content.assert_called_once()
+        self.assertNotEqual(first['fraud_probability'], second['fraud_probability'])
+
+
+class GenaiClientTest(unittest.TestCase):
+    def test_client_is_shared_per_api_key(self):
+        first = get_genai_client('test-key-a')
+
+        self.assertIs(get_genai_client('test-key-a'), first)
+        self.assertIsNot(get_genai_client('test-key-b'), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
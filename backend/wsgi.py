@@ -0,0 +1,12 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# Patch blocking I/O before requests/web3/httpx are imported so RPC and Gemini waits yield the greenlet
+from gevent import monkey
+monkey.patch_all()
+
+# app is not used here - gunicorn loads it as wsgi:app
+from app import app, load_contract  # noqa: F401
+
+if load_contract():
+    print("✅ Smart Contract Loaded Successfully")
+else:
+    print("⚠️  Deploy smart contracts first: truffle migrate --reset")